@@ -3,6 +3,19 @@ import random
 import copy
 import pentago
 import time
+import winlines
+import evaluation
+import evalcache
+import transposition
+import zobrist
+import symmetry
+import ordering
+import parallel
+import bitboard
+import playouts
+import uct
+import solver
+import threats
 # ---------------------------------------------------------------------------
 # JL Popyack, ported to Python, May 2019, updated Nov 2021. v2 Nov 29, 2021
 # Ehsan Khosroshahi, updated Nov 2023.
@@ -28,10 +41,44 @@ descr = {
 
 
 
+class SearchTimeout(Exception):
+    # Raised inside a search when its deadline has passed
+    pass
+
+
 class Player:
     WINNING_SCORE = 1000000
     # Set the losing score to a low value beyond the normal heuristic range
     LOSING_SCORE = -1000000
+    # With use_symmetry the 8 symmetric twins of a position are treated as
+    # one: leaves are scored on their canonical variant (evaluate), and
+    # while at least SYMMETRY_MIN_EMPTY cells are empty the twins share one
+    # transposition entry (tt_key).  sg3824_h depends on the direction of a
+    # line, so this changes the heuristic, and it is off by default.
+    SYMMETRY_MIN_EMPTY = 26
+    use_symmetry = False
+    # Leaf evaluation mode, one of evaluation.EVAL_MODES; "full" is sg3824_h
+    eval_mode = "full"
+    # Size of the evaluation cache each agent starts with (None: no cache).
+    # An evalcache.EvalCache can also be assigned to share one between agents.
+    EVAL_CACHE_BYTES = evalcache.DEFAULT_BYTES
+    # Searching agents use a process pool when workers > 1
+    workers = 1
+    parallel = None
+    # Opening book (book.OpeningBook) consulted before searching, if any
+    book = None
+    # Print the statistics of the search components (tables, caches, ...)
+    # after every move; telemetry.py records them without printing
+    verbose = False
+    # Searches expand one move per distinct child position (moves whose
+    # rotation leaves the same board are searched once)
+    distinct_children = True
+    # Searches only expand the winning moves of a node that has some, and
+    # only the moves parrying the opponent's immediate wins when there are
+    # such threats (see threats.restrict_moves).  The test costs well under
+    # a millisecond even where the opponent threatens (threats.safe_cells),
+    # and cuts late-game trees by more than half.
+    use_threats = True
     def __init__ (self,player_number,token, depth_limit, time_limit):
         self.INFINITY = 10000
         self.player_number = player_number
@@ -40,70 +87,37 @@ class Player:
         
         if token.lower() in ["b","w"]:
             self.token = token.lower()
+        self.eval_cache = evalcache.EvalCache(max_bytes=self.EVAL_CACHE_BYTES) if self.EVAL_CACHE_BYTES else None
 
     def __str__ (self):
         return self.player_number + " is a " + self.__class__.__name__.lower() +  " agent and plays " + descr[self.token].lower() + " tokens."
     
     def player_type(self):
         return self.__class__.__name__
+
+    def seed_playouts(self, seed):
+        # Make the agent's random choices reproducible; agents without any
+        # ignore the seed
+        pass
     
+    def child_moves(self, board, token):
+        # Move codes the searches expand for token to move (see
+        # distinct_children and use_threats)
+        white, black = board.mask('w'), board.mask('b')
+        if self.distinct_children:
+            moves = bitboard.distinct_moves(white, black, token)
+        else:
+            moves = board.get_moves(encoded=True)
+        if self.use_threats:
+            own, opp = (white, black) if token == 'w' else (black, white)
+            moves = threats.restrict_moves(own, opp, moves)
+        return moves
+
     def win(self,board):
-    # Check for winner beginning with each element.
-    # It is possible that both players have multiple "wins"	
-        numWins = 0
-        for i in range(board.BOARD_SIZE):
-            for j in range(board.BOARD_SIZE):
-                if board.board[i][j] == self.token:
-                    # win in row starting with board[i][j]
-                    if j<=1:
-                        count = 5
-                        k = j
-                        fiveInRow = True
-                        while count>0 and fiveInRow:
-                            fiveInRow = ( board.board[i][k]==self.token )
-                            k = k + 1
-                            count = count - 1
-                        if fiveInRow:
-                            numWins = numWins + 1
-                    # win in col starting with board[i][j]
-                    if i<=1:
-                        count = 5
-                        k = i
-                        fiveInRow = True
-                        while count>0 and fiveInRow:
-                            fiveInRow = ( board.board[k][j]==self.token )
-                            k = k + 1
-                            count = count - 1
-                        if fiveInRow:
-                            numWins = numWins + 1
-                    # win in main diag starting with board[i][j]
-                    if i<=1 and j<=1:
-                        count = 5
-                        m = i
-                        n = j
-                        fiveInRow = True
-                        while count>0 and fiveInRow:
-                            fiveInRow = ( board.board[m][n]==self.token )
-                            m = m + 1
-                            n = n + 1
-                            count = count - 1
-                        if fiveInRow:
-                            numWins = numWins + 1
-                    # win in off diag starting with board[i][j]
-                    if i<=1 and j>=4 :
-                        count = 5
-                        m = i
-                        n = j
-                        fiveInRow = True
-                        while count>0 and fiveInRow:
-                            fiveInRow = ( board.board[m][n]==self.token )
-                            m = m + 1
-                            n = n - 1
-                            count = count - 1
-                        if fiveInRow:
-                            numWins = numWins + 1
-
-        return (numWins>0)
+    # Check for a five-in-a-row of this player's token using the precomputed
+    # line masks in winlines.py.
+    # It is possible that both players have multiple "wins"
+        return winlines.has_five(board.mask(self.token))
 
     def explain_move(self,move, board):
         gameBlock = int(move[0])  # 1,2,3,4
@@ -135,41 +149,13 @@ class Player:
         return score
 
     def advanced_line_scoring(self, board, token):
-        score = 0
-        # Check each row, column, and diagonal for scoring patterns
-        for i in range(board.BOARD_SIZE):
-            score += self.score_line(board.board[i], token)  # Check row
-            score += self.score_line([board.board[j][i] for j in range(board.BOARD_SIZE)], token)  # Check column
-
-        # Score diagonals
-        for diag in board.get_diagonals():
-            score += self.score_line(diag, token)
-
-        return score
+        # Score each row, column, and diagonal for patterns with the
+        # precomputed line tables (see evaluation.line_scoring)
+        return evaluation.line_scoring(board.mask('w'), board.mask('b'), token)
 
     def score_line(self, line, token):
-        score = 0
-        # Define scoring for different patterns
-        patterns = {
-            '5': 10000,  # Five in a row
-            '4': 1000,  # Four in a row
-            '3': 100,  # Three in a row
-            '2': 10,  # Two in a row
-            '1': 1,  # Single token
-        }
-        consecutive_count = 0
-        for element in line:
-            if element == token:
-                consecutive_count += 1
-            elif element != '.':
-                # If there's a blocking token, reset the count
-                consecutive_count = 0
-            # Get the pattern score and reset count
-            score += patterns.get(str(consecutive_count), 0)
-            if element != token:
-                consecutive_count = 0
-
-        return score
+        # Pattern scores for runs of tokens; shared with evaluation.py
+        return evaluation.score_line(line, token)
 
     def evaluate_twist_potential(self, board, token):
         score = 0
@@ -195,7 +181,73 @@ class Player:
 
         return score
 
+    def evaluate(self, board, token, alpha=float('-inf'), beta=float('inf')):
+        # Same value as sg3824_h, computed incrementally by rescoring only the
+        # lines each candidate rotation/move touches (see evaluation.py).
+        # Other eval_modes trade accuracy for speed; "lazy" uses the search
+        # window (alpha, beta) to decide when the exact value is needed.
+        # With use_symmetry the canonical symmetric variant is scored
+        # instead, which makes the evaluation identical for the 8 symmetric
+        # twins of a position.  Scores are cached under the masks of the
+        # position actually scored; lazy scores depend on the window and are
+        # not cached.
+        if self.use_symmetry:
+            white, black, s = symmetry.canonical(board)
+            if s:
+                board = bitboard.BitBoard.from_masks(white, black)
+        else:
+            white, black = board.mask('w'), board.mask('b')
+        cache = self.eval_cache
+        if cache is None or self.eval_mode == "lazy":
+            return evaluation.evaluate(board, token, self.eval_mode, alpha, beta)
+        key = (white, black, token, self.eval_mode)
+        score = cache.get(key)
+        if score is None:
+            score = evaluation.evaluate(board, token, self.eval_mode)
+            cache.put(key, score)
+        return score
 
+    def parallel_search(self):
+        # Process pool for root-parallel search, started on first use and
+        # kept for the rest of the game (see parallel.py)
+        if self.parallel is None:
+            self.parallel = parallel.RootParallelSearch(self, self.workers)
+        return self.parallel
+
+    def close(self):
+        # Release resources held between moves (the worker processes), and
+        # save the evaluation cache if it has a file
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+        if self.eval_cache is not None and self.eval_cache.path is not None:
+            self.eval_cache.save()
+
+    def tt_key(self, board, maximizing_player):
+        # Zobrist key of the position plus whose turn it is in the search, and
+        # the symmetry applied to it.  In the opening the key is that of the
+        # canonical symmetric variant, so the 8 symmetric positions share one
+        # entry; moves are stored in the canonical frame (see symmetry.py).
+        # Twins only share entries with use_symmetry, which makes their
+        # scores equal; with the plain sg3824_h a shared entry would carry the
+        # score of a mirrored twin, so every position keeps its own key.
+        if self.use_symmetry and board.empty_cells >= self.SYMMETRY_MIN_EMPTY:
+            key, s = symmetry.canonical_key(board)
+        else:
+            key, s = board.hash, 0
+        if not maximizing_player:
+            key ^= zobrist.SIDE_KEY
+        return key, s
+
+    def book_move(self, board):
+        # Text of the book move for this position, or None
+        if self.book is None:
+            return None
+        return self.move_text(self.book.probe(board, self.token))
+
+    def move_text(self, move):
+        # Searches work with integer move codes; get_move returns text.
+        return None if move is None else pentago.decode_move(move)
 
     @abstractmethod
     def get_move(self, state):
@@ -240,142 +292,500 @@ class Random(Player):
 
         return selected_move
 class Minimax(Player):
-    def __init__(self,player_number,token, depth_limit, time_limit):
+    def __init__(self,player_number,token, depth_limit, time_limit, tt_bytes=transposition.DEFAULT_BYTES, workers=1):
         super().__init__(player_number,token, depth_limit, time_limit)
+        self.tt = transposition.TranspositionTable(tt_bytes)
+        # With workers > 1 the root moves are searched by a process pool
+        self.workers = workers
+        # Nodes searched in this process since the last get_move
+        self.nodes = 0
+
+    def search_fixed_depth(self, board, depth):
+        #---------------------------------------------------------------------------
+        # (score, move) of a search of board to exactly depth, in parallel
+        # when workers > 1.
+        #---------------------------------------------------------------------------
+        board = board.copy()
+        if self.workers > 1 and depth > 1 and not self.win(board):
+            self.parallel_search().new_search()
+            return self.parallel_search().minimax_root(board, depth, self.child_moves(board, self.token))
+        return self.minimax(board, depth, True)
 
     def minimax(self, board, depth, maximizing_player):
         # print(f"Minimax called at depth {depth} for {'maximizing' if maximizing_player else 'minimizing'} player")
+        self.nodes += 1
 
         if depth == 0 or self.win(board):  # If we are at the depth limit or a terminal state is detected
-            return self.sg3824_h(board, self.token), None
+            return self.evaluate(board, self.token), None
+
+        # Positions already searched at least this deep are answered from the table
+        key, sym = self.tt_key(board, maximizing_player)
+        entry = self.tt.probe(key)
+        if entry is not None and entry[0] >= depth:
+            return entry[2], symmetry.map_move(entry[3], symmetry.INVERSE[sym])
 
         if maximizing_player:  # Maximizing player (AI)
             max_eval = float('-inf')
             best_move = None
-            for move in board.get_moves():
-                new_board = board.apply_move(move, self.token)  # Apply the move
-                eval, _ = self.minimax(new_board, depth - 1, False)  # Recurse for the minimizing player
+            for move in self.child_moves(board, self.token):
+                undo = board.make_move(move, self.token)  # Apply the move in place
+                eval, _ = self.minimax(board, depth - 1, False)  # Recurse for the minimizing player
+                board.unmake_move(undo)
                 if eval > max_eval:  # If the move is better than the current best, update max_eval and best_move
                     max_eval = eval
                     best_move = move
+            self.tt.store(key, depth, transposition.EXACT, max_eval, symmetry.map_move(best_move, sym))
             return max_eval, best_move
         else:  # Minimizing player (opponent)
             min_eval = float('inf')
             best_move = None
             opponent_token = 'b' if self.token == 'w' else 'w'
-            for move in board.get_moves():
-                new_board = board.apply_move(move, opponent_token)  # Apply the move for the opponent
-                if self.win(new_board):  # Directly check for opponent win
+            for move in self.child_moves(board, opponent_token):
+                undo = board.make_move(move, opponent_token)  # Apply the move for the opponent
+                if self.win(board):  # Directly check for opponent win
+                    board.unmake_move(undo)
+                    self.tt.store(key, depth, transposition.EXACT, float('-inf'), None)
                     return float('-inf'), None  # Worst case for maximizer
-                eval, _ = self.minimax(new_board, depth - 1, True)  # Recurse for the maximizing player
+                eval, _ = self.minimax(board, depth - 1, True)  # Recurse for the maximizing player
+                board.unmake_move(undo)
                 if eval < min_eval:  # If the move is worse for the maximizing player, update min_eval and best_move
                     min_eval = eval
                     best_move = move
+            self.tt.store(key, depth, transposition.EXACT, min_eval, symmetry.map_move(best_move, sym))
             return min_eval, best_move
 
     def get_move(self, board):
+        self.nodes = 0
+        book_move = self.book_move(board)
+        if book_move is not None:
+            return book_move
         start_time = time.time()
-        _, best_move = self.minimax(board, self.depth_limit, True)  # Start the minimax algorithm
+        self.tt.new_search()
+        # The whole search runs on one private copy of the board via make/unmake
+        _, best_move = self.search_fixed_depth(board, self.depth_limit)  # Start the minimax algorithm
         end_time = time.time()
-        print(f"Minimax Search Time: {end_time - start_time} seconds")
-        return best_move
+        print(f"Minimax Search Time: {end_time - start_time} seconds ({self.nodes} nodes)")
+        if self.verbose:
+            print(self.tt)
+            print(self.eval_cache)
+        return self.move_text(best_move)
 
 class Alphabeta(Player):
-    def __init__(self,player_number,token, depth_limit, time_limit):
+    # The clock is read once every NODE_CHECK_INTERVAL nodes, and a search
+    # stops at TIME_MARGIN of time_limit to leave room for unwinding.
+    NODE_CHECK_INTERVAL = 16
+    TIME_MARGIN = 0.95
+    # With at most solver_empty_cells empty cells the exact endgame solver
+    # (solver.py) gets up to SOLVER_TIME_SHARE of the time; if it cannot
+    # prove the result the normal search runs in the time left.
+    solver_empty_cells = 8
+    SOLVER_TIME_SHARE = 0.5
+    # Before the full search, a forcing-sequence search (threats.py) looks
+    # for a win within threat_depth moves in up to THREAT_TIME_SHARE of the
+    # time (0: no threat search)
+    threat_depth = 3
+    THREAT_TIME_SHARE = 0.2
+
+    def __init__(self,player_number,token, depth_limit, time_limit, tt_bytes=transposition.DEFAULT_BYTES, workers=1):
         super().__init__(player_number,token, depth_limit, time_limit)
+        self.tt = transposition.TranspositionTable(tt_bytes)
+        self.orderer = ordering.MoveOrderer()
+        # With workers > 1 the root moves are searched by a process pool
+        self.workers = workers
+        self.deadline = float('inf')
+        self.nodes = 0
+        # Depth of the last iteration completed by get_move
+        self.completed_depth = 0
+        # Nodes the endgame solver and the threat search searched for the
+        # last move
+        self.solver_nodes = 0
+        self.threat_nodes = 0
+        self.pv = []
+        self.root_best = None
+        self.solver = solver.EndgameSolver()
+        self.threat_search = threats.ThreatSearch()
+
+    def tt_store(self, key, sym, depth, value, move, alpha, beta):
+        # Record value with the bound type implied by the original window
+        if value <= alpha:
+            flag = transposition.UPPER
+        elif value >= beta:
+            flag = transposition.LOWER
+        else:
+            flag = transposition.EXACT
+        self.tt.store(key, depth, flag, value, symmetry.map_move(move, sym))
+
+    def alphabeta(self, board, depth, alpha, beta, maximizing_player, ply=0, on_pv=False):
+        # on_pv is True along the principal variation of the previous
+        # iteration, whose move is then searched first.
+        self.nodes += 1
+        if self.nodes % self.NODE_CHECK_INTERVAL == 0 and time.time() >= self.deadline:
+            raise SearchTimeout()
 
-    def alphabeta(self, board, depth, alpha, beta, maximizing_player):
         if depth == 0 or self.win(board):
-            return self.sg3824_h(board, self.token), None
+            return self.evaluate(board, self.token, alpha, beta), None
+
+        # Transposition table: cut off on a deep enough entry, or at least
+        # narrow the window and search its best move early.
+        key, sym = self.tt_key(board, maximizing_player)
+        alpha_orig, beta_orig = alpha, beta
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_depth, flag, score, tt_move = entry
+            tt_move = symmetry.map_move(tt_move, symmetry.INVERSE[sym])
+            if tt_depth >= depth:
+                if flag == transposition.EXACT:
+                    return score, tt_move
+                if flag == transposition.LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    return score, tt_move
+        pv_move = self.pv[ply] if on_pv and ply < len(self.pv) else None
+        mover = self.token if maximizing_player else ('b' if self.token == 'w' else 'w')
+        moves = self.orderer.order(board, self.child_moves(board, mover), mover, ply, tt_move, pv_move)
 
         if maximizing_player:
             max_eval = float('-inf')
             best_move = None
-            for move in board.get_moves():
-                new_board = board.apply_move(move, self.token)
-                eval, _ = self.alphabeta(new_board, depth - 1, alpha, beta, False)
+            for index, move in enumerate(moves):
+                undo = board.make_move(move, self.token)
+                eval, _ = self.alphabeta(board, depth - 1, alpha, beta, False, ply + 1, move == pv_move)
+                board.unmake_move(undo)
                 if eval > max_eval:
                     max_eval = eval
                     best_move = move
+                    if ply == 0:
+                        self.root_best = move
                 alpha = max(alpha, eval)
                 if alpha >= self.WINNING_SCORE:  # Early termination for a winning move
+                    self.orderer.record_cutoff(move, ply, depth, index)
+                    self.tt_store(key, sym, depth, alpha, best_move, alpha_orig, beta_orig)
                     return alpha, best_move
                 if beta <= alpha:
+                    self.orderer.record_cutoff(move, ply, depth, index)
                     break
+            self.tt_store(key, sym, depth, max_eval, best_move, alpha_orig, beta_orig)
             return max_eval, best_move
         else:
             min_eval = float('inf')
             best_move = None
             opponent_token = 'b' if self.token == 'w' else 'w'
-            for move in board.get_moves():
-                new_board = board.apply_move(move, opponent_token)
-                eval, _ = self.alphabeta(new_board, depth - 1, alpha, beta, True)
+            for index, move in enumerate(moves):
+                undo = board.make_move(move, opponent_token)
+                eval, _ = self.alphabeta(board, depth - 1, alpha, beta, True, ply + 1, move == pv_move)
+                board.unmake_move(undo)
                 if eval < min_eval:
                     min_eval = eval
                     best_move = move
                 beta = min(beta, eval)
                 if beta <= self.LOSING_SCORE:  # Early termination for a losing move
+                    self.orderer.record_cutoff(move, ply, depth, index)
+                    self.tt_store(key, sym, depth, beta, best_move, alpha_orig, beta_orig)
                     return beta, best_move
                 if beta <= alpha:
+                    self.orderer.record_cutoff(move, ply, depth, index)
                     break
+            self.tt_store(key, sym, depth, min_eval, best_move, alpha_orig, beta_orig)
             return min_eval, best_move
 
+    def root_search(self, board, depth):
+        #---------------------------------------------------------------------------
+        # One iteration of the search from the root; (score, move).
+        #---------------------------------------------------------------------------
+        if self.workers > 1 and depth > 1 and not self.win(board):
+            pv_move = self.pv[0] if self.pv else None
+            root_moves = self.orderer.order(board, self.child_moves(board, self.token), self.token, 0, None, pv_move)
+            score, move, nodes = self.parallel_search().alphabeta_root(board, depth, root_moves, self.deadline)
+            self.nodes += nodes
+            return score, move
+        return self.alphabeta(board, depth, float('-inf'), float('inf'), True, 0, True)
+
+    def search_fixed_depth(self, board, depth):
+        # (score, move) of a single search of board to exactly depth
+        self.deadline = float('inf')
+        self.pv = []
+        if self.workers > 1:
+            self.parallel_search().new_search()
+        return self.root_search(board.copy(), depth)
+
+    def principal_variation(self, board, depth):
+        #---------------------------------------------------------------------------
+        # Follow the best moves stored in the transposition table from board.
+        #---------------------------------------------------------------------------
+        pv = []
+        undo_stack = []
+        tokens = (self.token, 'b' if self.token == 'w' else 'w')
+        for ply in range(depth):
+            key, sym = self.tt_key(board, ply % 2 == 0)
+            entry = self.tt.probe(key)
+            if entry is None or entry[3] is None:
+                break
+            move = symmetry.map_move(entry[3], symmetry.INVERSE[sym])
+            if move not in board.get_moves(encoded=True):
+                break
+            pv.append(move)
+            undo_stack.append(board.make_move(move, tokens[ply % 2]))
+        while undo_stack:
+            board.unmake_move(undo_stack.pop())
+        return pv
+
     def get_move(self, board):
-        # Determine the number of empty cells to estimate the game phase
+        #---------------------------------------------------------------------------
+        # Iterative deepening up to depth_limit, bounded by time_limit seconds.
+        # If time runs out during an iteration, the best move of the last
+        # completed depth is played.  Each iteration searches the previous
+        # principal variation first.  Book positions are answered from the
+        # opening book without searching, endgames by the solver when it
+        # proves the result in time, and positions with a forced win found
+        # by the threat search by its first move.
+        #---------------------------------------------------------------------------
+        self.nodes = 0
+        self.completed_depth = 0
+        self.solver_nodes = 0
+        self.threat_nodes = 0
+        book_move = self.book_move(board)
+        if book_move is not None:
+            return book_move
         start_time = time.time()
-        empty_cells = sum(row.count('.') for row in board.board)
-
-        # Adjust the depth dynamically based on the number of empty cells
-        if empty_cells > (board.BOARD_SIZE ** 2) // 2:
-            # Early game, more empty cells, shallower search
-            current_depth = min(self.depth_limit, 1)
-        elif empty_cells > board.BOARD_SIZE:
-            # Midgame, moderate number of empty cells, medium search depth
-            current_depth = self.depth_limit // 2
-
-            # USE THIS LIMIT IF SEARCH STARTS TAKING A LOT OF TIME AGAINST HUMAN AGENTS
-            #current_depth = min(self.depth_limit, 1)
-        else:
-            # Endgame, fewer empty cells, deeper search
-            current_depth = self.depth_limit
+        if board.empty_cells <= self.solver_empty_cells and not self.win(board):
+            solver_deadline = start_time + float(self.time_limit) * self.TIME_MARGIN * self.SOLVER_TIME_SHARE
+            _, move, proven = self.solver.solve(board, self.token, solver_deadline)
+            self.solver_nodes = self.solver.nodes
+            if self.verbose:
+                print(self.solver)
+            if proven and move is not None:
+                return self.move_text(move)
+        if self.threat_depth and not self.win(board):
+            own, opp = board.mask(self.token), board.mask('b' if self.token == 'w' else 'w')
+            threat_deadline = time.time() + float(self.time_limit) * self.TIME_MARGIN * self.THREAT_TIME_SHARE
+            move = self.threat_search.find_win(own, opp, self.threat_depth, threat_deadline)
+            self.threat_nodes = self.threat_search.nodes
+            if self.verbose:
+                print(self.threat_search)
+            if move is not None:
+                return self.move_text(move)
+        self.deadline = start_time + float(self.time_limit) * self.TIME_MARGIN
+        self.pv = []
+        self.tt.new_search()
+        self.orderer.new_search()
+        if self.workers > 1:
+            self.parallel_search().new_search()
+
+        # The whole search runs on one private copy of the board via make/unmake
+        board = board.copy()
+        legal_moves = board.get_moves(encoded=True)
+        best_move = None
+        for depth in range(1, min(self.depth_limit, board.empty_cells) + 1):
+            self.root_best = None
+            try:
+                _, move = self.root_search(board, depth)
+            except SearchTimeout:
+                # The board copy is left mid-search; it is not used again
+                break
+            if move is not None:
+                best_move = move
+            self.completed_depth = depth
+            self.pv = self.principal_variation(board, depth) or [move]
+
+        if best_move is None:
+            # Not even the first iteration finished: take its best move so far
+            best_move = self.root_best if self.root_best is not None else (legal_moves[0] if legal_moves else None)
 
-        # Proceed with the Alpha-beta search with the adjusted depth
-        _, best_move = self.alphabeta(board, current_depth, float('-inf'), float('inf'), True)
         end_time = time.time()
-        print(f"Alpha-Beta Search Time: {end_time - start_time} seconds")
+        print(f"Alpha-Beta Search Time: {end_time - start_time} seconds (depth {self.completed_depth}, {self.nodes} nodes)")
+        if self.verbose:
+            print(self.tt)
+            print(self.eval_cache)
+            print(self.orderer)
+
+        return self.move_text(best_move)
+
+class Pvs(Alphabeta):
+    #---------------------------------------------------------------------------
+    # Principal variation search in negamax form: scores are seen from the
+    # side to move, so one branch serves both players.  The first move of a
+    # node is searched with the full window, the others with a null window
+    # around alpha and searched again with the full window only when they
+    # fail high.  Each iteration of the deepening starts with an aspiration
+    # window of half-width ASPIRATION_WINDOW around the previous score (see
+    # root_search), widened by ASPIRATION_GROWTH after every fail and opened
+    # completely after ASPIRATION_TRIES fails.  The root score moves by
+    # 30000 to 260000 from one iteration to the next of the same parity, so
+    # a narrower window fails and searches again more than it saves.  Book,
+    # solver, tables, move ordering and the time control are those of
+    # Alphabeta, and alphabeta() is kept as a wrapper so the root-parallel
+    # search works unchanged.
+    #---------------------------------------------------------------------------
+    ASPIRATION_WINDOW = 200000
+    ASPIRATION_GROWTH = 4
+    ASPIRATION_TRIES = 2
+
+    def __init__(self,player_number,token, depth_limit, time_limit, tt_bytes=transposition.DEFAULT_BYTES, workers=1):
+        super().__init__(player_number, token, depth_limit, time_limit, tt_bytes, workers)
+        # Root scores of the iterations of the current search
+        self.iteration_scores = []
+        self.researches = 0
+        self.aspiration_fails = 0
+
+    def pvs(self, board, depth, alpha, beta, token, ply=0, on_pv=False):
+        # Negamax score of board for token to move, fail-soft in (alpha, beta)
+        self.nodes += 1
+        if self.nodes % self.NODE_CHECK_INTERVAL == 0 and time.time() >= self.deadline:
+            raise SearchTimeout()
+
+        maximizing_player = token == self.token
+        if depth == 0 or self.win(board):
+            if maximizing_player:
+                return self.evaluate(board, self.token, alpha, beta), None
+            return -self.evaluate(board, self.token, -beta, -alpha), None
+
+        key, sym = self.tt_key(board, maximizing_player)
+        alpha_orig, beta_orig = alpha, beta
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_depth, flag, score, tt_move = entry
+            tt_move = symmetry.map_move(tt_move, symmetry.INVERSE[sym])
+            if tt_depth >= depth:
+                if flag == transposition.EXACT:
+                    return score, tt_move
+                if flag == transposition.LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    return score, tt_move
+        pv_move = self.pv[ply] if on_pv and ply < len(self.pv) else None
+        moves = self.orderer.order(board, self.child_moves(board, token), token, ply, tt_move, pv_move)
+
+        opponent_token = 'b' if token == 'w' else 'w'
+        best = float('-inf')
+        best_move = None
+        for index, move in enumerate(moves):
+            undo = board.make_move(move, token)
+            if index == 0:
+                score = -self.pvs(board, depth - 1, -beta, -alpha, opponent_token, ply + 1, move == pv_move)[0]
+            else:
+                score = -self.pvs(board, depth - 1, -alpha - 1, -alpha, opponent_token, ply + 1)[0]
+                if alpha < score < beta:
+                    self.researches += 1
+                    score = -self.pvs(board, depth - 1, -beta, -alpha, opponent_token, ply + 1)[0]
+            board.unmake_move(undo)
+            if score > best:
+                best = score
+                best_move = move
+                if ply == 0:
+                    self.root_best = move
+            alpha = max(alpha, score)
+            if alpha >= self.WINNING_SCORE or beta <= alpha:
+                self.orderer.record_cutoff(move, ply, depth, index)
+                break
+        self.tt_store(key, sym, depth, best, best_move, alpha_orig, beta_orig)
+        return best, best_move
+
+    def alphabeta(self, board, depth, alpha, beta, maximizing_player, ply=0, on_pv=False):
+        # The Alphabeta interface (scores for self.token) on top of pvs
+        if maximizing_player:
+            return self.pvs(board, depth, alpha, beta, self.token, ply, on_pv)
+        opponent_token = 'b' if self.token == 'w' else 'w'
+        score, move = self.pvs(board, depth, -beta, -alpha, opponent_token, ply, on_pv)
+        return -score, move
+
+    def root_search(self, board, depth):
+        #---------------------------------------------------------------------------
+        # One iteration from the root inside an aspiration window.  The
+        # evaluation swings between odd and even depths, so the guess is the
+        # score of the last iteration of the same parity when there is one.
+        #---------------------------------------------------------------------------
+        scores = self.iteration_scores
+        guess = scores[-2] if len(scores) >= 2 else (scores[-1] if scores else None)
+        if (self.workers > 1 and depth > 1) or guess is None or abs(guess) >= self.WINNING_SCORE:
+            score, move = super().root_search(board, depth)
+            scores.append(score)
+            return score, move
+        window = self.ASPIRATION_WINDOW
+        alpha, beta = guess - window, guess + window
+        fails = 0
+        while True:
+            score, move = self.pvs(board, depth, alpha, beta, self.token, 0, True)
+            if alpha < score < beta or (alpha == float('-inf') and beta == float('inf')):
+                break
+            self.aspiration_fails += 1
+            fails += 1
+            window *= self.ASPIRATION_GROWTH
+            if score <= alpha:
+                alpha = guess - window if fails < self.ASPIRATION_TRIES else float('-inf')
+            else:
+                beta = guess + window if fails < self.ASPIRATION_TRIES else float('inf')
+        scores.append(score)
+        return score, move
+
+    def search_fixed_depth(self, board, depth):
+        self.iteration_scores = []
+        return super().search_fixed_depth(board, depth)
 
-        return best_move
+    def get_move(self, board):
+        self.iteration_scores = []
+        self.researches = 0
+        self.aspiration_fails = 0
+        move = super().get_move(board)
+        if self.verbose:
+            print(f"PVS: {self.researches} re-searches, {self.aspiration_fails} aspiration fails")
+        return move
 
 class Minimax_mcts(Player):
+    # Engine of the batched playouts (see playouts.playout_counts): None uses
+    # NumPy when it is installed, False the pure-Python engine, which draws
+    # the same random stream as the serial playouts
+    use_numpy = None
 
-    def __init__(self, player_number, token, depth_limit, time_limit, num_playouts=100):
+    def __init__(self, player_number, token, depth_limit, time_limit, num_playouts=100, batched=False,
+                 seed=None, chunk_size=None):
         super().__init__(player_number, token, depth_limit, time_limit)
         self.num_playouts = num_playouts
+        # With batched=True each chunk of playouts runs as one batch in
+        # playouts.py (vectorized when NumPy is available).  In both modes a
+        # game starts with the opponent to move, since our candidate move
+        # has been made, and is scored by playouts.outcome.
+        self.batched = batched
+        # Playouts are split into chunks of chunk_size games (default: one
+        # chunk per candidate move), each with its own random stream derived
+        # from seed and the position, so a seed gives the same move at any
+        # number of workers.
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.chunk_size = chunk_size
       # self.alphabeta_agent = Alphabeta(player_number, token, depth_limit, time_limit)
         self.minimax_agent = Minimax(player_number, token, depth_limit, time_limit)
+        self.minimax_agent.eval_cache = self.eval_cache
 
     def minimax_for_mcts(self, board, top_n=8):
-        moves = board.get_moves()
+        moves = self.child_moves(board, self.token)
         best_moves = []
 
         # Evaluate each possible move using the heuristic
         for move in moves:
-            new_board = board.apply_move(move, self.token)
-            score = self.sg3824_h(new_board, self.token)
+            undo = board.make_move(move, self.token)
+            score = self.evaluate(board, self.token)
+            board.unmake_move(undo)
             best_moves.append((score, move))
 
         # Sort the moves by the heuristic score and select the top 'n' moves
-        best_moves.sort(reverse=True)
+        # (ties go to the later move in text order, as with text moves)
+        best_moves.sort(key=lambda x: (x[0], pentago.MOVE_TEXT[x[1]]), reverse=True)
         best_moves = best_moves[:top_n]
 
         # For the top 'n' moves, look one step ahead with Alpha-beta search for the opponent's response
         final_moves = []
         for score, move in best_moves:
-            new_board = board.apply_move(move, self.token)
+            undo = board.make_move(move, self.token)
             # Perform Alpha-beta/Minimax search with a depth of 1, which is effectively the opponent's next move
             # NOTE: For testing purposes I tried MCTS with both alpha beta and minimax but for the final submission I have left only MCTS with minimax implementation as was given in the question
-            # opponent_score, _ = self.alphabeta_agent.alphabeta(new_board, 1, float('-inf'), float('inf'), False)
-            opponent_score, _ = self.minimax_agent.minimax(new_board, 1, False)
+            # opponent_score, _ = self.alphabeta_agent.alphabeta(board, 1, float('-inf'), float('inf'), False)
+            opponent_score, _ = self.minimax_agent.minimax(board, 1, False)
+            board.unmake_move(undo)
 
             final_moves.append((opponent_score, move))
 
@@ -384,44 +794,148 @@ class Minimax_mcts(Player):
 
         # Return the top 'n' moves for the MCTS playouts
         return [move for _, move in final_moves[:top_n]]
-    def playout(self, board, token):
-        # Play a random game starting with the given board and token
-        current_token = token
-        while True:
-            moves = board.get_moves()
-            if not moves or board.is_full():  # No moves left or the board is full
-                break
-            move = random.choice(moves)
-            board = board.apply_move(move, current_token)
-            if self.win(board):
-                return current_token
-            current_token = 'b' if current_token == 'w' else 'w'  # Switch player
-        return None  # No winner
+    def playout(self, board, token, rng=random):
+        # Play a random game starting with the given board and token, and
+        # return its outcome (the winner's token or playouts.DRAW).  Moves
+        # are made in place and taken back before returning, so the board is
+        # left unchanged.
+        return playouts.random_playout(board, token, rng)
+
+    def playout_chunk(self, board, count, seed):
+        # Number of our wins in count playouts from board (the position after
+        # our candidate move, so the opponent moves first), using only the
+        # random stream given by seed.
+        opponent = 'b' if self.token == 'w' else 'w'
+        if self.batched:
+            (wins, draws, losses), = playouts.playout_counts([board], opponent, count, self.token, seed=seed,
+                                                             use_numpy=self.use_numpy)
+            return wins
+        rng = random.Random(seed)
+        wins = 0
+        for _ in range(count):
+            if self.playout(board, opponent, rng) == self.token:
+                wins += 1
+        return wins
+
+    def playout_tasks(self, board, moves):
+        # (candidate index, playouts, seed) per chunk.  The split and the
+        # seeds depend only on self.seed, the position and the candidates.
+        base_seed = playouts.derive_seed(self.seed, board.to_string())
+        chunk_size = self.chunk_size or self.num_playouts
+        tasks = []
+        for index, move in enumerate(moves):
+            for chunk, first in enumerate(range(0, self.num_playouts, chunk_size)):
+                count = min(chunk_size, self.num_playouts - first)
+                tasks.append((index, count, playouts.derive_seed(base_seed, move, chunk)))
+        return tasks
+
+    def parallel_search(self):
+        # Process pool for the playout chunks (see parallel.py)
+        if self.parallel is None:
+            self.parallel = parallel.ParallelPlayouts(self, self.workers)
+        return self.parallel
+
+    def playout_wins(self, board, moves):
+        # Our wins in the playouts after each of moves
+        tasks = self.playout_tasks(board, moves)
+        if self.workers > 1:
+            return self.parallel_search().run(board, moves, tasks)
+        wins = [0] * len(moves)
+        for index, count, seed in tasks:
+            undo = board.make_move(moves[index], self.token)
+            wins[index] += self.playout_chunk(board, count, seed)
+            board.unmake_move(undo)
+        return wins
 
     def mcts(self, board):
         # Perform the Monte Carlo Tree Search from the current board state
         start_time = time.time()
+        # Every playout runs on this one board via make/unmake; a BitBoard,
+        # whatever kind of board the game passes in
+        board = bitboard.BitBoard.from_masks(board.mask('w'), board.mask('b'))
         best_moves = self.minimax_for_mcts(board)  # Get the best moves from minimax
+        wins = self.playout_wins(board, best_moves)
         best_move = None
         best_score = float('-inf')
-        for move in best_moves:
-            wins = 0
-            for _ in range(self.num_playouts):
-                new_board = board.apply_move(move, self.token)
-                winner = self.playout(new_board, self.token)
-                if winner == self.token:
-                    wins += 1
-            if wins > best_score:
-                best_score = wins
+        for move, move_wins in zip(best_moves, wins):
+            if move_wins > best_score:
+                best_score = move_wins
                 best_move = move
+        # Kept for inspection (playouts.check_batched_against_serial)
+        self.candidates = best_moves
+        self.wins = wins
+        self.best_move = best_move
         end_time = time.time()
-        print("Search time: ", (end_time-start_time), "seconds")
-        return best_move
+        print("Search time: ", (end_time-start_time), "seconds", "(playout seed", str(self.seed) + ")")
+        return self.move_text(best_move)
+
+    def seed_playouts(self, seed):
+        # Same seed, same playouts: the moves do not depend on workers
+        self.seed = seed
 
     def get_move(self, board):
+        book_move = self.book_move(board)
+        if book_move is not None:
+            return book_move
 
         return self.mcts(board)
 
+class Mcts(Player):
+    #---------------------------------------------------------------------------
+    # UCT Monte Carlo tree search (uct.py).  Runs playouts until time_limit
+    # (or max_playouts) is used up and plays the most visited root move.  The
+    # tree is kept between moves: the subtree under the position reached after
+    # our move and the opponent's reply becomes the next root.
+    #---------------------------------------------------------------------------
+    TIME_MARGIN = 0.95
+
+    def __init__(self, player_number, token, depth_limit, time_limit,
+                 exploration=uct.EXPLORATION, policy="ucb1", max_playouts=None, reuse_tree=True,
+                 leaf_playouts=1):
+        super().__init__(player_number, token, depth_limit, time_limit)
+        self.exploration = exploration
+        self.policy = policy
+        # max_playouts bounds the iterations; each one runs leaf_playouts games
+        self.max_playouts = max_playouts
+        self.leaf_playouts = leaf_playouts
+        self.reuse_tree = reuse_tree
+        self.tree = None
+        self.rng = random.Random()
+        # Tree iterations and playout games of the last move, read by telemetry
+        self.nodes = 0
+        self.playouts = 0
+
+    def seed_playouts(self, seed):
+        self.rng = random.Random(seed)
+
+    def get_move(self, board):
+        self.nodes = 0
+        self.playouts = 0
+        book_move = self.book_move(board)
+        if book_move is not None:
+            return book_move
+        start_time = time.time()
+        deadline = start_time + float(self.time_limit) * self.TIME_MARGIN
+        reused = self.reuse_tree and self.tree is not None and self.tree.reuse(board, self.token)
+        if not reused:
+            self.tree = uct.UctTree(board, self.token, self.exploration, self.policy, self.rng,
+                                    self.leaf_playouts)
+        kept = self.tree.visits[0]
+        self.nodes = self.tree.search(deadline, self.max_playouts)
+        self.playouts = self.tree.visits[0] - kept
+        best_move = self.tree.best_move()
+        if best_move is None:
+            legal_moves = board.get_moves(encoded=True)
+            best_move = legal_moves[0] if legal_moves else None
+
+        end_time = time.time()
+        print(f"MCTS Search Time: {end_time - start_time} seconds ({self.playouts} playouts, "
+              f"{kept} reused, {len(self.tree)} nodes)")
+        if self.verbose:
+            for text, visits, rate in self.tree.summary(3):
+                print(f"  {text}: {visits} visits, {100 * rate:.1f}% wins")
+        return self.move_text(best_move)
+
 
 # CODE FOR UNIT TESTING:
 
@@ -0,0 +1,332 @@
+import ast
+import concurrent.futures
+import contextlib
+import getopt
+import inspect
+import io
+import math
+import random
+import sys
+import time
+
+import agents
+import bitboard
+import pentago
+import playouts
+import records
+import telemetry
+
+# ---------------------------------------------------------------------------
+# Headless arena.
+# Plays many games between agent configurations without printing boards,
+# spread over a process pool.  Every pair of configurations plays each
+# opening twice, once with each color.  Openings are the -b start strings
+# given, else random openings of -p plies (-p 0: the empty board).  Each result
+# is streamed as it arrives (one line, and optionally one JSON record per
+# game through a telemetry sink, and the games into a binary record file,
+# see records.py); at the end a table gives win/draw/loss,
+# the Elo difference with its 95% confidence interval, and the average move
+# time of every agent.
+#
+# An agent configuration is an agent class of agents.py with options:
+#   alphabeta:depth=3,time=10        minimax_mcts:num_playouts=200
+#   mcts:time=2,policy="puct"        alphabeta:depth=2,eval_mode="lazy"
+#   minimax_mcts:seed=7              (a fixed playout seed, as main.py -s)
+# depth and time are the depth and time limits; other options are passed to
+# the constructor if it takes them, else set as attributes of the agent.
+#
+#   python3 arena.py <agent> <agent> ... [-g pairs] [-w workers] [-p plies]
+#                    [-b start] ... [-s seed] [-d depth] [-t time] [-o results.jsonl]
+#                    [-r games.rec]
+# ---------------------------------------------------------------------------
+
+DEFAULT_DEPTH = 1
+DEFAULT_TIME = 100
+# z for a two-sided 95% confidence interval
+Z_95 = 1.959964
+
+
+def parse_agent(spec, depth_limit=DEFAULT_DEPTH, time_limit=DEFAULT_TIME):
+    #---------------------------------------------------------------------------
+    # (class, depth limit, time limit, options) of an agent configuration.
+    #---------------------------------------------------------------------------
+    name, _, text = spec.partition(":")
+    agent_class = getattr(agents, name.capitalize(), None)
+    if not isinstance(agent_class, type) or not issubclass(agent_class, agents.Player):
+        raise ValueError("Unknown agent: " + name)
+    options = {}
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        try:
+            options[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            options[key] = value
+    depth_limit = options.pop("depth", depth_limit)
+    time_limit = options.pop("time", time_limit)
+    return agent_class, depth_limit, time_limit, options
+
+
+def make_agent(spec, player_number, token, depth_limit=DEFAULT_DEPTH, time_limit=DEFAULT_TIME):
+    agent_class, depth_limit, time_limit, options = parse_agent(spec, depth_limit, time_limit)
+    parameters = inspect.signature(agent_class.__init__).parameters
+    kwargs = {key: value for key, value in options.items() if key in parameters}
+    agent = agent_class(player_number, token, depth_limit, time_limit, **kwargs)
+    for key, value in options.items():
+        if key not in parameters:
+            if not hasattr(agent, key):
+                raise ValueError("Unknown option for %s: %s" % (agent_class.__name__, key))
+            setattr(agent, key, value)
+    return agent
+
+
+def random_openings(count, plies, seed):
+    # count start strings of plies random moves from the empty board, none
+    # of them finished
+    rng = random.Random(seed)
+    openings = []
+    while len(openings) < count:
+        board = bitboard.BitBoard()
+        token = 'w'
+        for ply in range(plies):
+            board.make_move(rng.choice(board.get_moves(encoded=True)), token)
+            token = playouts.opponent_of(token)
+        if playouts.outcome(board) is None:
+            openings.append(board.to_string())
+    return openings
+
+
+def play_game(white_spec, black_spec, start="", seed=0, depth_limit=DEFAULT_DEPTH, time_limit=DEFAULT_TIME):
+    #---------------------------------------------------------------------------
+    # Play one game, white first from start (as with -b in main.py), with
+    # the agents' output discarded.  Returns a dict with the result ('w', 'b' or '.'), the
+    # moves played, and per color the number of moves and the time spent in
+    # get_move.  An illegal move loses the game.
+    #---------------------------------------------------------------------------
+    random.seed(seed)
+    board = bitboard.BitBoard(start)
+    players = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        players['w'] = make_agent(white_spec, "Player 1", 'w', depth_limit, time_limit)
+        players['b'] = make_agent(black_spec, "Player 2", 'b', depth_limit, time_limit)
+    times = {'w': 0.0, 'b': 0.0}
+    counts = {'w': 0, 'b': 0}
+    moves = []
+    token = 'w'
+    result = playouts.outcome(board)
+    reason = None
+    try:
+        while result is None:
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                move = players[token].get_move(board)
+            times[token] += time.perf_counter() - start_time
+            counts[token] += 1
+            code = pentago.MOVE_CODE.get(move)
+            if code is None or (board.white | board.black) >> (code >> 3) & 1:
+                result = playouts.opponent_of(token)
+                reason = "illegal move " + repr(move)
+                break
+            moves.append(move)
+            board.make_move(code, token)
+            result = playouts.outcome(board)
+            token = playouts.opponent_of(token)
+    finally:
+        for player in players.values():
+            player.close()
+    return {
+        "white_agent": white_spec,
+        "black_agent": black_spec,
+        "start": start,
+        "seed": seed,
+        "result": result,
+        "reason": reason,
+        "moves": moves,
+        "final": board.to_string(),
+        "move_counts": counts,
+        "move_times": times,
+    }
+
+
+def _play_task(task):
+    index, white, black, start, seed, depth_limit, time_limit = task
+    record = play_game(white[1], black[1], start, seed, depth_limit, time_limit)
+    record["game"] = index
+    record["white"] = white[0]
+    record["black"] = black[0]
+    return record
+
+
+def schedule(specs, pairs, openings, seed=0, depth_limit=DEFAULT_DEPTH, time_limit=DEFAULT_TIME):
+    #---------------------------------------------------------------------------
+    # Tasks of a round robin: for every two configurations, pairs openings
+    # (taken in turn from openings), each played once with each color.
+    #---------------------------------------------------------------------------
+    players = list(zip(labels_of(specs), specs))
+    tasks = []
+    for first in range(len(specs)):
+        for second in range(first + 1, len(specs)):
+            for pair in range(pairs):
+                start = openings[pair % len(openings)]
+                for white, black in ((first, second), (second, first)):
+                    index = len(tasks)
+                    tasks.append((index, players[white], players[black], start,
+                                  playouts.derive_seed(seed, index), depth_limit, time_limit))
+    return tasks
+
+
+def run(tasks, workers=1):
+    #---------------------------------------------------------------------------
+    # Yield the game records of tasks as they finish.
+    #---------------------------------------------------------------------------
+    if workers <= 1:
+        for task in tasks:
+            yield _play_task(task)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_task, task) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def elo(score):
+    # Elo difference giving the expected score (0..1)
+    if score <= 0:
+        return float('-inf')
+    if score >= 1:
+        return float('inf')
+    return -400 * math.log10(1 / score - 1)
+
+
+class Standings:
+#--------------------------------------------------------------------------------
+# Results per pair of configurations and move times per configuration.
+#--------------------------------------------------------------------------------
+
+    def __init__(self):
+        self.pairs = {}       # (a, b) -> [wins of a, draws, losses of a]
+        self.move_time = {}   # spec -> [seconds, moves]
+
+    def add(self, record):
+        white, black = record["white"], record["black"]
+        a, b = sorted((white, black))
+        counts = self.pairs.setdefault((a, b), [0, 0, 0])
+        if record["result"] == playouts.DRAW:
+            counts[1] += 1
+        elif (record["result"] == 'w') == (white == a):
+            counts[0] += 1
+        else:
+            counts[2] += 1
+        for token, spec in (('w', white), ('b', black)):
+            total = self.move_time.setdefault(spec, [0.0, 0])
+            total[0] += record["move_times"][token]
+            total[1] += record["move_counts"][token]
+
+    def summary(self, a, b):
+        #---------------------------------------------------------------------------
+        # (wins, draws, losses, score, elo, elo low, elo high) of a against b.
+        # The interval is the 95% Wilson interval of the score (a draw
+        # counting half), which stays finite on one side for a 100% or 0%
+        # score.
+        #---------------------------------------------------------------------------
+        wins, draws, losses = self.pairs[(a, b)]
+        games = wins + draws + losses
+        score = (wins + 0.5 * draws) / games
+        z2 = Z_95 * Z_95 / games
+        centre = (score + z2 / 2) / (1 + z2)
+        margin = Z_95 * math.sqrt(score * (1 - score) / games + z2 / (4 * games)) / (1 + z2)
+        return (wins, draws, losses, score, elo(score) + 0.0,
+                elo(round(centre - margin, 12)), elo(round(centre + margin, 12)))
+
+    def report(self):
+        lines = []
+        for a, b in sorted(self.pairs):
+            wins, draws, losses, score, rating, low, high = self.summary(a, b)
+            lines.append("%s vs %s: +%d =%d -%d  score %.3f  Elo %+.0f [%+.0f, %+.0f]"
+                         % (a, b, wins, draws, losses, score, rating, low, high))
+        for spec in sorted(self.move_time):
+            seconds, moves = self.move_time[spec]
+            lines.append("%s: %d moves, %.3f s per move" % (spec, moves, seconds / moves if moves else 0.0))
+        return "\n".join(lines)
+
+
+def labels_of(specs):
+    # Names of the configurations in results; a configuration given more
+    # than once (self-play) gets #1, #2, ... so its results are kept apart
+    labels = []
+    for k, spec in enumerate(specs):
+        if specs.count(spec) > 1:
+            labels.append("%s#%d" % (spec, specs[:k].count(spec) + 1))
+        else:
+            labels.append(spec)
+    return labels
+
+
+if __name__ == "__main__":
+    specs = []
+    args = sys.argv[1:]
+    while args and not args[0].startswith("-"):
+        specs.append(args.pop(0))
+    if len(specs) < 2:
+        print("Usage: python3 arena.py <agent> <agent> ... [-g pairs] [-w workers] [-p plies] [-b start] "
+              "[-s seed] [-d depth] [-t time] [-o results.jsonl] [-r games.rec]")
+        sys.exit(2)
+    try:
+        opts, rest = getopt.getopt(args, "g:w:p:b:s:d:t:o:r:",
+                                   ["games=", "workers=", "plies=", "board=", "seed=", "depth=", "time=", "output=",
+                                    "record="])
+    except getopt.GetoptError as err:
+        print(err)
+        sys.exit(2)
+    pairs = 10
+    workers = 1
+    plies = 2
+    starts = []
+    seed = 0
+    depth_limit = DEFAULT_DEPTH
+    time_limit = DEFAULT_TIME
+    sink = None
+    record = None
+    for opt, arg in opts:
+        if opt in ("-g", "--games"):
+            pairs = int(arg)
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt in ("-p", "--plies"):
+            plies = int(arg)
+        elif opt in ("-b", "--board"):
+            starts.append(arg)
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+        elif opt in ("-d", "--depth"):
+            depth_limit = int(arg)
+        elif opt in ("-t", "--time"):
+            time_limit = float(arg)
+        elif opt in ("-o", "--output"):
+            sink = telemetry.open_sink(arg)
+        elif opt in ("-r", "--record"):
+            record = records.GameRecordWriter(arg)
+
+    for spec in specs:
+        parse_agent(spec)
+    openings = starts or (random_openings(pairs, plies, seed) if plies > 0 else [""])
+    tasks = schedule(specs, pairs, openings, seed, depth_limit, time_limit)
+    print("%d games, %d workers" % (len(tasks), workers))
+    standings = Standings()
+    start_time = time.time()
+    for done, result in enumerate(run(tasks, workers), 1):
+        standings.add(result)
+        if sink is not None:
+            sink.emit(result)
+        if record is not None:
+            record.write_game(result["start"], result["moves"], result["result"],
+                              meta={"players": [result["white"], result["black"]], "game": result["game"]})
+        print("[%d/%d] game %d: %s (white) vs %s (black): %s in %d moves%s"
+              % (done, len(tasks), result["game"], result["white"], result["black"],
+                 {'w': "white wins", 'b': "black wins"}.get(result["result"], "draw"), len(result["moves"]),
+                 ", " + result["reason"] if result["reason"] else ""))
+    print("\n%.0f s" % (time.time() - start_time))
+    print(standings.report())
+    if sink is not None:
+        sink.close()
+    if record is not None:
+        record.close()
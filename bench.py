@@ -0,0 +1,414 @@
+import contextlib
+import getopt
+import io
+import json
+import platform
+import random
+import sys
+import time
+
+import agents
+import bitboard
+import pentago
+import playouts
+import threats
+import uct
+import winlines
+
+# ---------------------------------------------------------------------------
+# Benchmark suite.
+# Each benchmark measures one rate (operations per second, best of several
+# runs) and, where it is deterministic, an operation count:
+#   perft/...     move generation: leaf nodes of the full game tree to a
+#                 fixed depth from the empty board and from fixed positions,
+#                 checked against the list-based PentagoBoard
+#   ops/...       apply_move, make/unmake_move, move generation, win,
+#                 sg3824_h and the threat-restricted move list on a fixed
+#                 set of positions
+#   threats/...   forcing-sequence search (threats.py) on the same
+#                 positions, nodes/s; the count is the forced wins found
+#   search/...    fixed-depth search of each searching agent, nodes/s
+#   playouts/...  random playouts (both engines of playouts.py, the UCT
+#                 tree and Minimax_mcts), playouts/s
+# Results can be saved as a JSON baseline and later runs compared against
+# it: a rate lower than the baseline by more than the threshold, or a
+# changed count, is reported as a regression and the exit status is 1.
+#
+#   python3 bench.py [-s filter] [-r repeats] [-o baseline.json]
+#   python3 bench.py -c baseline.json [-t 0.1] [-o new_baseline.json]
+#
+# bench_baseline.json, next to this file, is the reference baseline: check a
+# change with "python3 bench.py -c bench_baseline.json".  Its counts hold on
+# any machine; its rates only on the machine it records, so on another one
+# write a local baseline with -o from the unchanged tree first and compare
+# against that.  Rewrite it with -o bench_baseline.json when a change is
+# meant to alter a count.
+# ---------------------------------------------------------------------------
+
+FORMAT = 1
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.10
+
+# Fixed positions, as accepted by -b in main.py (white to move)
+POSITIONS = {
+    "empty": "",
+    "opening": "......" ".w..b." "......" "...w.." ".b...." "......",
+    "middle": "...wb...w..bw..b...wb...b.......wwb.",
+    # The example of main.py; white has winning moves
+    "example": "w.b.bw.w.b.wb.w..wb....w...bw.bbb.ww",
+}
+
+# (position, depth)
+PERFT_CASES = [
+    ("empty", 2),
+    ("opening", 2),
+    ("middle", 2),
+    ("example", 2),
+]
+
+# (agent class name, position, depth)
+SEARCH_CASES = [
+    ("Minimax", "empty", 2),
+    ("Minimax", "middle", 1),
+    ("Alphabeta", "opening", 2),
+    ("Alphabeta", "middle", 2),
+    ("Pvs", "opening", 2),
+    ("Pvs", "middle", 2),
+]
+
+# Positions for the ops/ benchmarks: random games from the empty board
+OPS_POSITIONS = 200
+OPS_SEED = 1
+# The threats/ benchmarks search the first THREAT_POSITIONS of them
+THREAT_POSITIONS = 40
+THREAT_DEPTHS = (2, 3)
+
+
+def perft(board, token, depth):
+    #---------------------------------------------------------------------------
+    # Leaf nodes of the game tree of board to depth, token to move.  Games
+    # that have ended (a five or a full board) are leaves.
+    #---------------------------------------------------------------------------
+    if depth == 0 or winlines.has_five(board.mask('w')) or winlines.has_five(board.mask('b')) \
+            or board.is_full():
+        return 1
+    opponent = playouts.opponent_of(token)
+    nodes = 0
+    for move in board.get_moves(encoded=True):
+        undo = board.make_move(move, token)
+        nodes += perft(board, opponent, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def random_positions(count, seed=OPS_SEED):
+    # (board, side to move) pairs from random games, 0 to 28 stones placed
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = bitboard.BitBoard()
+        token = 'w'
+        for ply in range(rng.randrange(29)):
+            board.make_move(rng.choice(board.get_moves(encoded=True)), token)
+            token = playouts.opponent_of(token)
+            if playouts.outcome(board) is not None:
+                break
+        if playouts.outcome(board) is None:
+            positions.append((board, token))
+    return positions
+
+
+def finished_positions(count, seed=OPS_SEED):
+    # Final boards of random games from the empty board: a five for one or
+    # both players, or a full board
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = bitboard.BitBoard()
+        token = 'w'
+        while playouts.outcome(board) is None:
+            board.make_move(rng.choice(board.get_moves(encoded=True)), token)
+            token = playouts.opponent_of(token)
+        positions.append(board)
+    return positions
+
+
+def timed(run, repeats):
+    #---------------------------------------------------------------------------
+    # run() returns (operations, count or None).  Returns the best rate over
+    # repeats runs and the count, which must be the same in every run.
+    #---------------------------------------------------------------------------
+    best = 0.0
+    count = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        operations, run_count = run()
+        elapsed = time.perf_counter() - start
+        if count is not None and run_count != count:
+            raise RuntimeError("count changed between runs: %s, %s" % (count, run_count))
+        count = run_count
+        best = max(best, operations / elapsed if elapsed > 0 else float('inf'))
+    return best, count
+
+
+def _quiet(function, *args):
+    # Call function with its prints (search times etc.) discarded
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def perft_benchmarks():
+    for name, depth in PERFT_CASES:
+        def run(name=name, depth=depth):
+            nodes = perft(bitboard.BitBoard(POSITIONS[name]), 'w', depth)
+            return nodes, nodes
+
+        def check(name=name, depth=depth):
+            #---------------------------------------------------------------------------
+            # The same count with the list-based board; only done at depth <= 2
+            # to keep it quick.
+            #---------------------------------------------------------------------------
+            if depth > 2:
+                return None
+            return perft(pentago.PentagoBoard(POSITIONS[name]), 'w', depth)
+
+        yield "perft/%s/%d" % (name, depth), "nodes/s", run, check
+
+
+def ops_benchmarks():
+    positions = random_positions(OPS_POSITIONS)
+    moves = [board.get_moves(encoded=True) for board, token in positions]
+    # win() is checked on open and on finished positions, half and half
+    win_boards = [board for board, token in positions] + finished_positions(len(positions))
+    player = agents.Random("Bench", 'w', 1, 1)
+
+    def apply_move():
+        count = 0
+        for (board, token), legal in zip(positions, moves):
+            for move in legal:
+                board.apply_move(move, token)
+            count += len(legal)
+        return count, count
+
+    def make_unmake():
+        count = 0
+        for (board, token), legal in zip(positions, moves):
+            for move in legal:
+                board.unmake_move(board.make_move(move, token))
+            count += len(legal)
+        return count, count
+
+    def get_moves():
+        count = 0
+        for board, token in positions:
+            count += len(board.get_moves(encoded=True))
+        return len(positions), count
+
+    def distinct_moves():
+        count = 0
+        for board, token in positions:
+            count += len(bitboard.distinct_moves(board.white, board.black, token))
+        return len(positions), count
+
+    def win():
+        count = 0
+        for _ in range(10):
+            for board in win_boards:
+                if player.win(board):
+                    count += 1
+        return 10 * len(win_boards), count
+
+    def sg3824_h():
+        total = 0
+        for board, token in positions:
+            total += player.sg3824_h(board, token)
+        return len(positions), total
+
+    def restrict_moves():
+        count = 0
+        for board, token in positions:
+            own, opp = board.mask(token), board.mask(playouts.opponent_of(token))
+            count += len(threats.restrict_moves(own, opp, bitboard.distinct_moves(board.white, board.black, token)))
+        return len(positions), count
+
+    yield "ops/apply_move", "moves/s", apply_move, None
+    yield "ops/make_unmake", "moves/s", make_unmake, None
+    yield "ops/get_moves", "positions/s", get_moves, None
+    yield "ops/distinct_moves", "positions/s", distinct_moves, None
+    yield "ops/win", "checks/s", win, None
+    yield "ops/sg3824_h", "evals/s", sg3824_h, None
+    yield "ops/restrict_moves", "positions/s", restrict_moves, None
+
+
+def threat_benchmarks():
+    positions = random_positions(OPS_POSITIONS)[:THREAT_POSITIONS]
+    for depth in THREAT_DEPTHS:
+        def run(depth=depth):
+            search = threats.ThreatSearch()
+            nodes = 0
+            wins = 0
+            for board, token in positions:
+                own, opp = board.mask(token), board.mask(playouts.opponent_of(token))
+                if search.find_win(own, opp, depth) is not None:
+                    wins += 1
+                nodes += search.nodes
+            return nodes, wins
+
+        yield "threats/%d" % depth, "nodes/s", run, None
+
+
+def search_benchmarks():
+    for agent_name, name, depth in SEARCH_CASES:
+        def run(agent_name=agent_name, name=name, depth=depth):
+            # A fresh agent per run, so no cached results carry over
+            player = getattr(agents, agent_name)("Bench", 'w', depth, float('inf'))
+            score, move = _quiet(player.search_fixed_depth, bitboard.BitBoard(POSITIONS[name]), depth)
+            player.close()
+            return player.nodes, player.nodes
+
+        yield "search/%s/%s/%d" % (agent_name.lower(), name, depth), "nodes/s", run, None
+
+
+def playout_benchmarks():
+    board = bitboard.BitBoard(POSITIONS["opening"])
+
+    def python_engine():
+        counts = playouts.playout_counts([board], 'w', 200, 'w', seed=1, use_numpy=False)
+        return 200, None
+
+    def numpy_engine():
+        counts = playouts.playout_counts([board], 'w', 4000, 'w', seed=1, use_numpy=True)
+        return 4000, None
+
+    def uct_tree():
+        tree = uct.UctTree(board, 'w', rng=random.Random(1))
+        tree.search(float('inf'), 1000)
+        return tree.visits[0], None
+
+    def minimax_mcts():
+        player = agents.Minimax_mcts("Bench", 'w', 1, float('inf'), num_playouts=25, seed=1)
+        _quiet(player.mcts, board)
+        player.close()
+        # top_n = 8 candidate moves
+        return 8 * player.num_playouts, None
+
+    yield "playouts/python", "playouts/s", python_engine, None
+    if playouts.HAVE_NUMPY:
+        yield "playouts/numpy", "playouts/s", numpy_engine, None
+    yield "playouts/uct", "playouts/s", uct_tree, None
+    yield "playouts/minimax_mcts", "playouts/s", minimax_mcts, None
+
+
+SUITES = (perft_benchmarks, ops_benchmarks, threat_benchmarks, search_benchmarks, playout_benchmarks)
+
+
+def run_benchmarks(select=None, repeats=DEFAULT_REPEATS, log=print):
+    #---------------------------------------------------------------------------
+    # Runs the benchmarks whose name contains select (all if None).  Returns
+    # {name: {"value": rate, "unit": unit, "count": count}}.  A perft count
+    # that differs from the PentagoBoard count raises RuntimeError.
+    #---------------------------------------------------------------------------
+    results = {}
+    for suite in SUITES:
+        for name, unit, run, check in suite():
+            if select is not None and select not in name:
+                continue
+            value, count = timed(run, repeats)
+            if check is not None:
+                expected = check()
+                if expected is not None and expected != count:
+                    raise RuntimeError("%s: %d nodes, PentagoBoard gives %d" % (name, count, expected))
+            results[name] = {"value": value, "unit": unit, "count": count}
+            log("%-34s %14.1f %-12s%s" % (name, value, unit, "" if count is None else "  count %s" % count))
+    return results
+
+
+def baseline(results):
+    return {
+        "format": FORMAT,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "numpy": playouts.HAVE_NUMPY,
+        "results": results,
+    }
+
+
+def save_baseline(path, results):
+    with open(path, "w") as f:
+        json.dump(baseline(results), f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("format") != FORMAT:
+        raise ValueError("Unknown baseline format: " + path)
+    return data
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    #---------------------------------------------------------------------------
+    # Compares the results of a run with baseline results.  Returns a list of
+    # (name, old value, new value, ratio, status) for the benchmarks in
+    # both; status is "ok", "faster", "REGRESSION" (rate below 1 - threshold
+    # of the baseline) or "COUNT" (the operation count changed).
+    #---------------------------------------------------------------------------
+    rows = []
+    for name in sorted(set(old) & set(new)):
+        before = old[name]
+        after = new[name]
+        ratio = after["value"] / before["value"] if before["value"] else float('inf')
+        if before.get("count") != after.get("count"):
+            status = "COUNT"
+        elif ratio < 1 - threshold:
+            status = "REGRESSION"
+        elif ratio > 1 + threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, before["value"], after["value"], ratio, status))
+    return rows
+
+
+def print_comparison(rows, log=print):
+    log("%-34s %14s %14s %8s" % ("benchmark", "baseline", "now", "ratio"))
+    for name, before, after, ratio, status in rows:
+        log("%-34s %14.1f %14.1f %7.2fx  %s" % (name, before, after, ratio, status))
+
+
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "s:r:o:c:t:",
+                                   ["select=", "repeats=", "output=", "compare=", "threshold="])
+    except getopt.GetoptError as err:
+        print(err)
+        sys.exit(2)
+    select = None
+    repeats = DEFAULT_REPEATS
+    output = None
+    baseline_file = None
+    threshold = DEFAULT_THRESHOLD
+    for opt, arg in opts:
+        if opt in ("-s", "--select"):
+            select = arg
+        elif opt in ("-r", "--repeats"):
+            repeats = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-c", "--compare"):
+            baseline_file = arg
+        elif opt in ("-t", "--threshold"):
+            threshold = float(arg)
+
+    old = load_baseline(baseline_file)["results"] if baseline_file is not None else None
+    results = run_benchmarks(select, repeats)
+    if output is not None:
+        save_baseline(output, results)
+        print("Wrote", len(results), "results to", output)
+    if old is not None:
+        rows = compare(old, results, threshold)
+        print()
+        print_comparison(rows)
+        if any(status in ("REGRESSION", "COUNT") for name, before, after, ratio, status in rows):
+            sys.exit(1)
@@ -0,0 +1,360 @@
+import pentago
+import zobrist
+
+# ---------------------------------------------------------------------------
+# Packed (bitboard) backend for PentagoBoard.
+# Each player's stones are kept in one integer; cell [i][j] is bit i*6+j.
+# Quadrant rotations are table lookups, so placing a stone and rotating a
+# block is a handful of integer operations on the two masks.
+# ---------------------------------------------------------------------------
+
+BOARD_SIZE = 6
+GRID_SIZE = 3
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE
+FULL_MASK = (1 << NUM_CELLS) - 1
+
+
+def cell_index(i, j):
+    return i * BOARD_SIZE + j
+
+
+def _quadrant_cells(gameBlock):
+    #---------------------------------------------------------------------------
+    # Cells of gameBlock (1..4) in local row-major order, as (i, j) pairs.
+    #---------------------------------------------------------------------------
+    rowOffset = ((gameBlock - 1) // 2) * GRID_SIZE
+    colOffset = ((gameBlock - 1) % 2) * GRID_SIZE
+    return [(rowOffset + r, colOffset + c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+
+
+def _build_rotation_tables():
+    #---------------------------------------------------------------------------
+    # For every block and every one of its 512 stone patterns, precompute the
+    # pattern after a left (counter-clockwise) and right (clockwise) rotation.
+    # Tables are keyed by the masked board bits, so a lookup needs no shifting.
+    # Local cell (r,c) goes to (2-c,r) on a left turn and (c,2-r) on a right
+    # turn, the same mapping as PentagoBoard.rotate_left/rotate_right.
+    #---------------------------------------------------------------------------
+    masks = [0]
+    left_tables = [None]
+    right_tables = [None]
+    for gameBlock in range(1, 5):
+        cells = _quadrant_cells(gameBlock)
+        rowOffset, colOffset = cells[0]
+        bits = [1 << cell_index(i, j) for i, j in cells]
+        left_dest = []
+        right_dest = []
+        for i, j in cells:
+            r, c = i - rowOffset, j - colOffset
+            left_dest.append(1 << cell_index(rowOffset + 2 - c, colOffset + r))
+            right_dest.append(1 << cell_index(rowOffset + c, colOffset + 2 - r))
+
+        left = {}
+        right = {}
+        for pattern in range(1 << len(cells)):
+            src = 0
+            rotLeft = 0
+            rotRight = 0
+            for k in range(len(cells)):
+                if pattern >> k & 1:
+                    src |= bits[k]
+                    rotLeft |= left_dest[k]
+                    rotRight |= right_dest[k]
+            left[src] = rotLeft
+            right[src] = rotRight
+
+        masks.append(sum(bits))
+        left_tables.append(left)
+        right_tables.append(right)
+    return masks, left_tables, right_tables
+
+
+# QUADRANT_MASK[gameBlock], ROTATE_LEFT[gameBlock][bits], ROTATE_RIGHT[gameBlock][bits]
+# are indexed by gameBlock in 1..4 to match the move notation.
+QUADRANT_MASK, ROTATE_LEFT, ROTATE_RIGHT = _build_rotation_tables()
+
+
+def _build_symmetric_patterns():
+    #---------------------------------------------------------------------------
+    # For every block, the stone patterns (masked board bits) that a quarter
+    # turn leaves unchanged, and those for which the left and right turns
+    # give the same pattern (symmetric under a half turn).  The empty block
+    # is in both.
+    #---------------------------------------------------------------------------
+    invariant = [None]
+    half_turn = [None]
+    for gameBlock in range(1, 5):
+        left = ROTATE_LEFT[gameBlock]
+        right = ROTATE_RIGHT[gameBlock]
+        invariant.append(frozenset(bits for bits in left if left[bits] == bits))
+        half_turn.append(frozenset(bits for bits in left if left[bits] == right[bits]))
+    return invariant, half_turn
+
+
+# INVARIANT[gameBlock], HALF_TURN[gameBlock]: sets of masked block patterns
+INVARIANT, HALF_TURN = _build_symmetric_patterns()
+
+
+# Per move code: bit of the placed token, mask of the rotated block and the
+# rotation table to apply to it.
+MOVE_BIT = [1 << cell_index(i, j) for i, j, rotBlock, clockwise in pentago.MOVE_PARTS]
+MOVE_QMASK = [QUADRANT_MASK[rotBlock] for i, j, rotBlock, clockwise in pentago.MOVE_PARTS]
+MOVE_TABLE = [(ROTATE_RIGHT if clockwise else ROTATE_LEFT)[rotBlock]
+              for i, j, rotBlock, clockwise in pentago.MOVE_PARTS]
+
+
+# Zobrist data per move code: key of the placed token and block hash table.
+BLOCK_HASH = zobrist.build_block_tables(QUADRANT_MASK)
+MOVE_KEY = {token: [zobrist.KEYS[token][cell_index(i, j)] for i, j, rotBlock, clockwise in pentago.MOVE_PARTS]
+            for token in zobrist.TOKENS}
+MOVE_BLOCK_HASH = {token: [BLOCK_HASH[token][rotBlock] for i, j, rotBlock, clockwise in pentago.MOVE_PARTS]
+                   for token in zobrist.TOKENS}
+
+
+def rotate_mask(bits, gameBlock, direction):
+    #---------------------------------------------------------------------------
+    # Rotate the stones of one player inside gameBlock; direction is L or R.
+    #---------------------------------------------------------------------------
+    qmask = QUADRANT_MASK[gameBlock]
+    if direction == 'r' or direction == 'R':
+        return (bits & ~qmask) | ROTATE_RIGHT[gameBlock][bits & qmask]
+    return (bits & ~qmask) | ROTATE_LEFT[gameBlock][bits & qmask]
+
+
+def distinct_moves(white, black, token):
+    #---------------------------------------------------------------------------
+    # Move codes for token to move that lead to pairwise different positions,
+    # one per child: the first of get_moves order among the moves giving the
+    # same position.  A block whose two patterns a quarter turn leaves
+    # unchanged only contributes the left turn, and only if no other move
+    # has produced the unrotated board yet; a block symmetric under a half
+    # turn only contributes the left turn.  Remaining duplicates (e.g. a
+    # placement and rotation equal to another placement) are removed by
+    # comparing the children.
+    #---------------------------------------------------------------------------
+    if token == 'w':
+        own, opp = white, black
+    else:
+        own, opp = black, white
+    occupied = white | black
+    seen = set()
+    moves = []
+    for k in range(NUM_CELLS):
+        if occupied >> k & 1:
+            continue
+        placed = own | (1 << k)
+        code = k * pentago.NUM_ROTATIONS
+        for gameBlock in range(1, 5):
+            qmask = QUADRANT_MASK[gameBlock]
+            ownBits = placed & qmask
+            oppBits = opp & qmask
+            if ownBits in INVARIANT[gameBlock] and oppBits in INVARIANT[gameBlock]:
+                child = (placed, opp)
+                if child not in seen:
+                    seen.add(child)
+                    moves.append(code)
+            else:
+                restOwn = placed & ~qmask
+                restOpp = opp & ~qmask
+                left = ROTATE_LEFT[gameBlock]
+                child = (restOwn | left[ownBits], restOpp | left[oppBits])
+                if child not in seen:
+                    seen.add(child)
+                    moves.append(code)
+                if ownBits not in HALF_TURN[gameBlock] or oppBits not in HALF_TURN[gameBlock]:
+                    right = ROTATE_RIGHT[gameBlock]
+                    child = (restOwn | right[ownBits], restOpp | right[oppBits])
+                    if child not in seen:
+                        seen.add(child)
+                        moves.append(code + 1)
+            code += 2
+    return moves
+
+class BitBoard:
+#--------------------------------------------------------------------------------
+# Drop-in replacement for pentago.PentagoBoard that stores the position as
+# two bitmasks.  The PentagoBoard API (get_moves, apply_move, rotate_left,
+# rotate_right, to_string, __str__, empty_cells, is_full, get_diagonals and a
+# read-only 6x6 board view) is preserved, so agents and game.Game can use
+# either backend.
+#--------------------------------------------------------------------------------
+
+    __slots__ = ("white", "black", "empty_cells", "hash")
+
+    BOARD_SIZE = BOARD_SIZE
+    GRID_SIZE = GRID_SIZE
+    GRID_ELEMENTS = GRID_SIZE * GRID_SIZE
+
+    def __init__(self, board=""):
+        #---------------------------------------------------------------------------
+        # board is either a 36-character string (w, b, or .) as accepted by
+        # PentagoBoard, or empty for an empty board.
+        #---------------------------------------------------------------------------
+        white = 0
+        black = 0
+        for k, cell in enumerate(board):
+            if cell == 'w':
+                white |= 1 << k
+            elif cell == 'b':
+                black |= 1 << k
+        self.white = white
+        self.black = black
+        self.empty_cells = NUM_CELLS - bin(white | black).count("1")
+        # Zobrist key of the position, kept up to date by make/unmake_move
+        self.hash = zobrist.hash_masks(white, black)
+
+    @classmethod
+    def from_masks(cls, white, black):
+        newBoard = cls.__new__(cls)
+        newBoard.white = white
+        newBoard.black = black
+        newBoard.empty_cells = NUM_CELLS - bin(white | black).count("1")
+        newBoard.hash = zobrist.hash_masks(white, black)
+        return newBoard
+
+    @classmethod
+    def from_board(cls, board):
+        #---------------------------------------------------------------------------
+        # Convert any board exposing to_string() (e.g. PentagoBoard).
+        #---------------------------------------------------------------------------
+        return cls(board.to_string())
+
+    def copy(self):
+        newBoard = BitBoard.__new__(BitBoard)
+        newBoard.white = self.white
+        newBoard.black = self.black
+        newBoard.empty_cells = self.empty_cells
+        newBoard.hash = self.hash
+        return newBoard
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        if not isinstance(other, BitBoard):
+            return NotImplemented
+        return self.white == other.white and self.black == other.black
+
+    def __hash__(self):
+        return hash((self.white, self.black))
+
+    def mask(self, token):
+        return self.white if token == 'w' else self.black
+
+    def cell(self, i, j):
+        bit = 1 << cell_index(i, j)
+        if self.white & bit:
+            return 'w'
+        if self.black & bit:
+            return 'b'
+        return '.'
+
+    @property
+    def board(self):
+        # 6x6 list-of-lists view for code written against PentagoBoard.board.
+        # It is rebuilt on every access; writes to it do not affect the masks.
+        cells = self.to_string()
+        return [list(cells[row*BOARD_SIZE:(row+1)*BOARD_SIZE]) for row in range(BOARD_SIZE)]
+
+    def __str__(self):
+        cells = self.to_string()
+        outstr = "+-------+-------+\n"
+        for offset in range(0, BOARD_SIZE, GRID_SIZE):
+            for i in range(offset, GRID_SIZE + offset):
+                row = cells[i*BOARD_SIZE:(i+1)*BOARD_SIZE]
+                outstr += "| " + " ".join(row[:GRID_SIZE]) + " | " + " ".join(row[GRID_SIZE:]) + " |\n"
+            outstr += "+-------+-------+\n"
+        return outstr
+
+    def to_string(self):
+        white = self.white
+        black = self.black
+        return "".join('w' if white >> k & 1 else ('b' if black >> k & 1 else '.')
+                       for k in range(NUM_CELLS))
+
+    def get_moves(self, encoded=False):
+    #---------------------------------------------------------------------------
+    # Same moves, in the same order, as PentagoBoard.get_moves; integer move
+    # codes with encoded=True, text otherwise.
+    #---------------------------------------------------------------------------
+        moveList = []
+        occupied = self.white | self.black
+        for k in range(NUM_CELLS):
+            if not occupied >> k & 1:
+                moveList.extend(pentago.CELL_MOVES[k])
+        if encoded:
+            return moveList
+        return [pentago.MOVE_TEXT[code] for code in moveList]
+
+    def get_distinct_moves(self, token, encoded=False):
+        #---------------------------------------------------------------------------
+        # One move per distinct position token can reach (see distinct_moves).
+        #---------------------------------------------------------------------------
+        moveList = distinct_moves(self.white, self.black, token)
+        if encoded:
+            return moveList
+        return [pentago.MOVE_TEXT[code] for code in moveList]
+
+    def rotate_left(self, gameBlock):
+        return BitBoard.from_masks(rotate_mask(self.white, gameBlock, 'L'),
+                                   rotate_mask(self.black, gameBlock, 'L'))
+
+    def rotate_right(self, gameBlock):
+        return BitBoard.from_masks(rotate_mask(self.white, gameBlock, 'R'),
+                                   rotate_mask(self.black, gameBlock, 'R'))
+
+    def apply_move(self, move, token):
+    #---------------------------------------------------------------------------
+    # Perform the given move (text or code) and return the resulting board.
+    #---------------------------------------------------------------------------
+        newBoard = self.copy()
+        newBoard.make_move(move, token)
+        return newBoard
+
+    def make_move(self, move, token):
+        #---------------------------------------------------------------------------
+        # In-place version of apply_move; returns the undo record for
+        # unmake_move (the previous masks and hash).
+        #---------------------------------------------------------------------------
+        if move.__class__ is not int:
+            move = pentago.MOVE_CODE[move]
+        white = self.white
+        black = self.black
+        h = self.hash
+        undo = (white, black, h)
+        if token == 'w':
+            white |= MOVE_BIT[move]
+        else:
+            black |= MOVE_BIT[move]
+        h ^= MOVE_KEY[token][move]
+        qmask = MOVE_QMASK[move]
+        table = MOVE_TABLE[move]
+        whiteHash = MOVE_BLOCK_HASH['w'][move]
+        blackHash = MOVE_BLOCK_HASH['b'][move]
+        wq = white & qmask
+        bq = black & qmask
+        rwq = table[wq]
+        rbq = table[bq]
+        self.white = (white & ~qmask) | rwq
+        self.black = (black & ~qmask) | rbq
+        self.hash = h ^ whiteHash[wq] ^ whiteHash[rwq] ^ blackHash[bq] ^ blackHash[rbq]
+        self.empty_cells -= 1
+        return undo
+
+    def unmake_move(self, undo):
+        self.white, self.black, self.hash = undo
+        self.empty_cells += 1
+
+    def get_diagonals(self):
+        return [
+            [self.cell(i, i) for i in range(BOARD_SIZE)],  # Main diagonal
+            [self.cell(i, BOARD_SIZE - i - 1) for i in range(BOARD_SIZE)]  # Anti-diagonal
+        ]
+
+    def is_full(self):
+        return (self.white | self.black) == FULL_MASK
+
+    def to_pentago_board(self):
+        return pentago.PentagoBoard(self.to_string())
@@ -0,0 +1,211 @@
+# ---------------------------------------------------------------------------
+# Opening book.
+# The book is built offline by self-play from the empty board (or from
+# given -b start positions): every position reached in the first plies is
+# searched by a searching agent (-a: minimax, alphabeta or pvs) and its
+# best move is recorded.  Positions are stored in their canonical symmetric
+# form (see symmetry.py) with the move in the canonical frame, so one entry
+# answers all 8 symmetric twins.
+#
+# File format: an 8-byte header (magic, version, record count) followed by
+# fixed-size records sorted by (white mask, black mask, side to move).  At
+# run time the file is memory-mapped and searched by bisection, so opening a
+# book costs nothing and a lookup reads a handful of records.
+#
+#   python3 book.py <book file> [-a agent] [-d depth] [-p plies] [-g games] [-b start] ...
+# ---------------------------------------------------------------------------
+import getopt
+import mmap
+import random
+import struct
+import sys
+import time
+
+import bitboard
+import playouts
+import symmetry
+
+MAGIC = b"PB"
+VERSION = 1
+HEADER = struct.Struct("<2sHI")
+# white mask, black mask, side to move (0 white, 1 black), move code, weight
+RECORD = struct.Struct("<QQBHH")
+SIDES = ('w', 'b')
+MAX_WEIGHT = 0xFFFF
+
+
+def book_key(board, token):
+    #---------------------------------------------------------------------------
+    # (white, black, side) of the canonical variant of board with token to
+    # move, and the symmetry that maps board onto it.
+    #---------------------------------------------------------------------------
+    white, black, s = symmetry.canonical(board)
+    return (white, black, SIDES.index(token)), s
+
+
+def write_book(path, entries):
+    #---------------------------------------------------------------------------
+    # entries maps book keys to [(canonical move code, weight)], best first.
+    #---------------------------------------------------------------------------
+    records = []
+    for key in sorted(entries):
+        for move, weight in entries[key]:
+            records.append(RECORD.pack(key[0], key[1], key[2], move, min(weight, MAX_WEIGHT)))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        f.write(b"".join(records))
+    return len(records)
+
+
+class OpeningBook:
+#--------------------------------------------------------------------------------
+# Read-only view of a book file through mmap.
+#--------------------------------------------------------------------------------
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap cannot map an empty file
+            self.file.close()
+            raise ValueError("Not an opening book: " + path)
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or len(self.data) != HEADER.size + self.count * RECORD.size:
+            self.close()
+            raise ValueError("Not an opening book: " + path)
+        self.hits = 0
+        self.lookups = 0
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    def lookup(self, key):
+        #---------------------------------------------------------------------------
+        # [(canonical move code, weight)] stored for key, best first.
+        #---------------------------------------------------------------------------
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[:3] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        moves = []
+        while lo < self.count:
+            record = self._record(lo)
+            if record[:3] != key:
+                break
+            moves.append((record[3], record[4]))
+            lo += 1
+        return moves
+
+    def probe(self, board, token):
+        #---------------------------------------------------------------------------
+        # Best book move (code, in the frame of board) for token, or None.
+        #---------------------------------------------------------------------------
+        self.lookups += 1
+        key, s = book_key(board, token)
+        occupied = board.mask('w') | board.mask('b')
+        for move, weight in self.lookup(key):
+            move = symmetry.map_move(move, symmetry.INVERSE[s])
+            if not occupied >> (move >> 3) & 1:
+                self.hits += 1
+                return move
+        return None
+
+    def __str__(self):
+        return "Book: %d positions, %d lookups, %d hits" % (self.count, self.lookups, self.hits)
+
+
+def build(path, agent_class, depth=2, plies=4, games=16, starts=("",), explore=0.25, seed=0, log=print):
+    #---------------------------------------------------------------------------
+    # Self-play book builder.  In each game, every position of the first
+    # plies is searched to depth by agent_class (once per canonical position)
+    # and the searched move is recorded; the move actually played is a random
+    # one with probability explore, so the games branch out.  The weight of
+    # an entry is the number of games that reached it.  A position for which
+    # the search returns no move gets no entry and ends the game.  Returns
+    # the number of positions written.
+    #---------------------------------------------------------------------------
+    rng = random.Random(seed)
+    players = {token: agent_class("Book", token, depth, float('inf')) for token in SIDES}
+    entries = {}
+    visits = {}
+    start_time = time.time()
+    for start in starts:
+        for game in range(games):
+            board = bitboard.BitBoard(start)
+            token = 'w'
+            for ply in range(plies):
+                if playouts.outcome(board) is not None:
+                    break
+                key, s = book_key(board, token)
+                visits[key] = visits.get(key, 0) + 1
+                if key not in entries:
+                    _, move = players[token].search_fixed_depth(board, depth)
+                    entries[key] = None if move is None else symmetry.map_move(move, s)
+                    log("%d positions, %.0f s" % (len(entries), time.time() - start_time))
+                if entries[key] is None:
+                    break
+                move = symmetry.map_move(entries[key], symmetry.INVERSE[s])
+                if rng.random() < explore:
+                    move = rng.choice(board.get_moves(encoded=True))
+                board.make_move(move, token)
+                token = 'b' if token == 'w' else 'w'
+    for player in players.values():
+        player.close()
+    entries = {key: [(move, visits[key])] for key, move in entries.items() if move is not None}
+    write_book(path, entries)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    import agents
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 book.py <book file> [-a agent] [-d depth] [-p plies] [-g games] [-b start] ...")
+        sys.exit(2)
+    try:
+        opts, args = getopt.getopt(sys.argv[2:], "a:d:p:g:b:s:",
+                                   ["agent=", "depth=", "plies=", "games=", "board=", "seed="])
+    except getopt.GetoptError as err:
+        print(err)
+        sys.exit(2)
+    agent_name = "Alphabeta"
+    depth = 2
+    plies = 4
+    games = 16
+    seed = 0
+    starts = []
+    for opt, arg in opts:
+        if opt in ("-a", "--agent"):
+            agent_name = arg.capitalize()
+        elif opt in ("-d", "--depth"):
+            depth = int(arg)
+        elif opt in ("-p", "--plies"):
+            plies = int(arg)
+        elif opt in ("-g", "--games"):
+            games = int(arg)
+        elif opt in ("-b", "--board"):
+            starts.append(arg)
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+    # Only the agents with a fixed-depth search can build a book
+    searching = sorted(name for name, value in vars(agents).items()
+                       if isinstance(value, type) and hasattr(value, "search_fixed_depth"))
+    if agent_name not in searching:
+        print("Cannot build a book with agent %s; use one of: %s" % (agent_name.lower(), ", ".join(name.lower() for name in searching)))
+        sys.exit(2)
+    count = build(sys.argv[1], getattr(agents, agent_name), depth, plies, games, starts or ("",), seed=seed)
+    print("Wrote", count, "positions to", sys.argv[1])
@@ -0,0 +1,102 @@
+# ---------------------------------------------------------------------------
+# Bounded cache of leaf evaluations with least-recently-used eviction.
+# Entries are keyed by (white mask, black mask, token, evaluation mode), so
+# there are no false hits.  With Player.use_symmetry, Player.evaluate looks
+# positions up after canonicalizing them (see symmetry.py), so the 8
+# symmetric twins of a position share one entry.  The cache can be sized in entries or in bytes,
+# shared between agents and games, and saved to / loaded from a file so that
+# it persists across the games of a match.
+# ---------------------------------------------------------------------------
+import os
+import pickle
+from collections import OrderedDict
+
+# Rough size of one entry in CPython: the ordered-dict node, the key tuple
+# with its two mask integers, and the score.
+ENTRY_BYTES = 256
+DEFAULT_BYTES = 16 * 2**20
+
+
+class EvalCache:
+
+    def __init__(self, max_entries=None, max_bytes=DEFAULT_BYTES, path=None):
+        #---------------------------------------------------------------------------
+        # max_entries takes precedence over max_bytes.  If path is given and
+        # the file exists, its entries are loaded; save() writes them back.
+        #---------------------------------------------------------------------------
+        self.max_entries = max_entries if max_entries is not None else max(1, max_bytes // ENTRY_BYTES)
+        self.path = path
+        self.clear()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        # Cached score for key, or None
+        self.lookups += 1
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        entries = self.entries
+        entries[key] = score
+        entries.move_to_end(key)
+        self.stores += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def save(self, path=None):
+        path = path if path is not None else self.path
+        with open(path, "wb") as f:
+            pickle.dump(list(self.entries.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path=None):
+        #---------------------------------------------------------------------------
+        # Adds the entries saved in path, oldest first, as most recently used.
+        #---------------------------------------------------------------------------
+        path = path if path is not None else self.path
+        with open(path, "rb") as f:
+            items = pickle.load(f)
+        for key, score in items:
+            self.put(key, score)
+        self.stores -= len(items)
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def __str__(self):
+        s = self.stats()
+        return ("Eval cache: %d/%d entries, %d lookups, %d hits (%.1f%%), %d evictions"
+                % (s["entries"], s["max_entries"], s["lookups"], s["hits"], 100*s["hit_rate"],
+                   s["evictions"]))
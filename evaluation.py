@@ -0,0 +1,314 @@
+from operator import itemgetter
+import pentago
+
+# ---------------------------------------------------------------------------
+# Fast version of the sg3824 heuristic (Player.sg3824_h).
+#
+# The heuristic is the sum of three terms over the 14 scored lines (6 rows,
+# 6 columns and the two long diagonals):
+#   line score     - score_line summed over the lines of the board
+#   twist potential - best line score over the 8 single-block rotations
+#   mobility       - line score after each legal move, summed over all moves
+# LineEvaluator scores every line of a position once, for both tokens.  Twist
+# potential and mobility are then computed from those scores: each candidate
+# rotation/move is applied in place, only the lines it touches are rescored
+# against the cached values, and the change is undone.  A new LineEvaluator
+# is built per leaf; that costs about as much as keeping one in step with the
+# search through make/unmake would, and is 1% of the mobility term.
+# Mobility dominates the cost, so evaluate() also offers cheaper modes that
+# approximate it or leave it out (EVAL_MODES below).
+# ---------------------------------------------------------------------------
+
+BOARD_SIZE = 6
+GRID_SIZE = 3
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE
+TOKENS = ('w', 'b')
+
+# Pattern scores for runs of consecutive tokens in a line.
+PATTERNS = {
+    '5': 10000,  # Five in a row
+    '4': 1000,  # Four in a row
+    '3': 100,  # Three in a row
+    '2': 10,  # Two in a row
+    '1': 1,  # Single token
+}
+
+
+def score_line(line, token):
+    consecutive_count = 0
+    score = 0
+    for element in line:
+        if element == token:
+            consecutive_count += 1
+        elif element != '.':
+            # If there's a blocking token, reset the count
+            consecutive_count = 0
+        # Get the pattern score and reset count
+        score += PATTERNS.get(str(consecutive_count), 0)
+        if element != token:
+            consecutive_count = 0
+
+    return score
+
+
+def _build_lines():
+    #---------------------------------------------------------------------------
+    # Cell indices of the scored lines, in the order advanced_line_scoring
+    # visits them: row 0, column 0, row 1, column 1, ..., main diagonal,
+    # anti-diagonal.
+    #---------------------------------------------------------------------------
+    lines = []
+    for i in range(BOARD_SIZE):
+        lines.append(tuple(i*BOARD_SIZE + j for j in range(BOARD_SIZE)))
+        lines.append(tuple(j*BOARD_SIZE + i for j in range(BOARD_SIZE)))
+    lines.append(tuple(i*BOARD_SIZE + i for i in range(BOARD_SIZE)))
+    lines.append(tuple(i*BOARD_SIZE + BOARD_SIZE - i - 1 for i in range(BOARD_SIZE)))
+    return lines
+
+
+def _block_cells(gameBlock):
+    rowOffset = ((gameBlock - 1) // 2) * GRID_SIZE
+    colOffset = ((gameBlock - 1) % 2) * GRID_SIZE
+    return [(rowOffset + r)*BOARD_SIZE + colOffset + c for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+
+
+def _build_rotations():
+    #---------------------------------------------------------------------------
+    # ROTATIONS[gameBlock][direction] = (destination cells, source getter):
+    # after the rotation, destination cell k holds what source cell k held.
+    # The mapping is the one used by PentagoBoard.rotate_left/rotate_right.
+    #---------------------------------------------------------------------------
+    rotations = [None]
+    for gameBlock in range(1, 5):
+        cells = _block_cells(gameBlock)
+        base = cells[0]
+        left_dst = []
+        right_dst = []
+        for cell in cells:
+            r, c = divmod(cell - base, BOARD_SIZE)
+            left_dst.append(base + (2 - c)*BOARD_SIZE + r)
+            right_dst.append(base + c*BOARD_SIZE + 2 - r)
+        getter = itemgetter(*cells)
+        rotations.append({'L': (tuple(left_dst), getter), 'R': (tuple(right_dst), getter)})
+    return rotations
+
+
+LINES = _build_lines()
+LINE_GETTERS = [itemgetter(*line) for line in LINES]
+LINES_THROUGH_CELL = [tuple(l for l, line in enumerate(LINES) if k in line) for k in range(NUM_CELLS)]
+BLOCK_LINES = [None] + [tuple(l for l, line in enumerate(LINES) if set(line) & set(_block_cells(q)))
+                        for q in range(1, 5)]
+# Lines touched by placing a stone on cell k and then rotating gameBlock.
+MOVE_LINES = [[None] + [tuple(sorted(set(LINES_THROUGH_CELL[k]) | set(BLOCK_LINES[q]))) for q in range(1, 5)]
+              for k in range(NUM_CELLS)]
+ROTATIONS = _build_rotations()
+TWISTS = [(q, d) for q in range(1, 5) for d in ('L', 'R')]
+OPPOSITE = {'L': 'R', 'R': 'L'}
+
+# ---------------------------------------------------------------------------
+# Line score tables.
+# A line of 6 cells has 3^6 = 729 possible contents, so score_line is
+# precomputed for all of them at import (a few milliseconds, no cache file
+# needed).  LINE_TABLE[token][code] is indexed by the base-3 code of the line,
+# digit k being 0, 1 or 2 for '.', 'w' or 'b' in the k-th cell of the line;
+# LINE_SCORES[token] maps the tuple of cells to the same score, for the
+# evaluator, which keeps the position as a list of cells.
+# ---------------------------------------------------------------------------
+SYMBOLS = ('.', 'w', 'b')
+LINE_STATES = 3 ** BOARD_SIZE
+# TERNARY[bits] = base-3 code of a line whose stones are the 6 bits of bits
+TERNARY = [sum(3**k for k in range(BOARD_SIZE) if bits >> k & 1) for bits in range(1 << BOARD_SIZE)]
+
+
+def _build_line_tables():
+    tables = {}
+    scores = {}
+    for token in TOKENS:
+        table = []
+        by_cells = {}
+        for code in range(LINE_STATES):
+            cells_of_line = tuple(SYMBOLS[code // 3**k % 3] for k in range(BOARD_SIZE))
+            score = score_line(cells_of_line, token)
+            table.append(score)
+            by_cells[cells_of_line] = score
+        tables[token] = table
+        scores[token] = by_cells
+    return tables, scores
+
+
+LINE_TABLE, LINE_SCORES = _build_line_tables()
+
+
+def _build_placement_gains():
+    #---------------------------------------------------------------------------
+    # PLACEMENT_GAIN[token][cells of a line] = the line score token gains by
+    # a stone on each empty cell of the line, summed over those cells.  As
+    # every cell lies on the scored lines through it, the placement part of
+    # approx_mobility is the sum of this table over the 14 lines.
+    #---------------------------------------------------------------------------
+    gains = {}
+    for token in TOKENS:
+        scores = LINE_SCORES[token]
+        by_cells = {}
+        for cells_of_line, score in scores.items():
+            gain = 0
+            for k, cell in enumerate(cells_of_line):
+                if cell == '.':
+                    gain += scores[cells_of_line[:k] + (token,) + cells_of_line[k + 1:]] - score
+            by_cells[cells_of_line] = gain
+        gains[token] = by_cells
+    return gains
+
+
+PLACEMENT_GAIN = _build_placement_gains()
+
+
+def line_score(cells_of_line, token):
+    return LINE_SCORES[token][cells_of_line]
+
+
+# Cells of column 0, and the multiplier that gathers them: the bit of row i
+# (bit 6i) lands on bit 6i + 5(5-i) = 25 + i, and no two products overlap.
+_COLUMN = sum(1 << (i*BOARD_SIZE) for i in range(BOARD_SIZE))
+_GATHER = sum(1 << (5*k) for k in range(BOARD_SIZE))
+_ROW = (1 << BOARD_SIZE) - 1
+# (first cell, step) of the main and anti-diagonal
+_DIAGONALS = ((0, BOARD_SIZE + 1), (BOARD_SIZE - 1, BOARD_SIZE - 1))
+
+
+def line_scoring(white, black, token):
+    #---------------------------------------------------------------------------
+    # Player.advanced_line_scoring from the two stone masks: each of the 14
+    # lines is turned into its base-3 code and looked up in LINE_TABLE.
+    #---------------------------------------------------------------------------
+    table = LINE_TABLE[token]
+    score = 0
+    for i in range(BOARD_SIZE):
+        shift = i * BOARD_SIZE
+        score += table[TERNARY[white >> shift & _ROW] + 2*TERNARY[black >> shift & _ROW]]
+        score += table[TERNARY[((white >> i) & _COLUMN) * _GATHER >> 25 & _ROW]
+                       + 2*TERNARY[((black >> i) & _COLUMN) * _GATHER >> 25 & _ROW]]
+    for start, step in _DIAGONALS:
+        w = 0
+        b = 0
+        for k in range(BOARD_SIZE):
+            w |= (white >> (start + step*k) & 1) << k
+            b |= (black >> (start + step*k) & 1) << k
+        score += table[TERNARY[w] + 2*TERNARY[b]]
+    return score
+
+
+class LineEvaluator:
+#--------------------------------------------------------------------------------
+# Keeps a copy of the position together with the score of each line for both
+# tokens.  score(token) returns exactly Player.sg3824_h(board, token).
+#--------------------------------------------------------------------------------
+
+    def __init__(self, board):
+        self.cells = list(board.to_string())
+        self.line_scores = {}
+        for token in TOKENS:
+            table = LINE_SCORES[token]
+            self.line_scores[token] = [table[getter(self.cells)] for getter in LINE_GETTERS]
+
+    def _rotate(self, gameBlock, direction):
+        dst, getter = ROTATIONS[gameBlock][direction]
+        cells = self.cells
+        for k, value in zip(dst, getter(cells)):
+            cells[k] = value
+
+    def _delta(self, lines, token):
+        # Change in line score over lines, relative to the cached line scores.
+        cells = self.cells
+        scores = self.line_scores[token]
+        table = LINE_SCORES[token]
+        delta = 0
+        for l in lines:
+            delta += table[LINE_GETTERS[l](cells)] - scores[l]
+        return delta
+
+    def line_scoring(self, token):
+        return sum(self.line_scores[token])
+
+    def twist_potential(self, token):
+        base = sum(self.line_scores[token])
+        best = 0
+        for gameBlock, direction in TWISTS:
+            self._rotate(gameBlock, direction)
+            best = max(best, base + self._delta(BLOCK_LINES[gameBlock], token))
+            self._rotate(gameBlock, OPPOSITE[direction])
+        return best
+
+    def mobility(self, token):
+        base = sum(self.line_scores[token])
+        cells = self.cells
+        total = 0
+        for cell in range(NUM_CELLS):
+            if cells[cell] != '.':
+                continue
+            cells[cell] = token
+            touched = MOVE_LINES[cell]
+            for gameBlock, direction in TWISTS:
+                self._rotate(gameBlock, direction)
+                total += base + self._delta(touched[gameBlock], token)
+                self._rotate(gameBlock, OPPOSITE[direction])
+            cells[cell] = '.'
+        return total
+
+    def approx_mobility(self, token):
+        #---------------------------------------------------------------------------
+        # Estimate of mobility that treats the placement and the rotation of a
+        # move as independent: the line score after (cell, twist) is taken as
+        # base + gain of the placement alone + gain of the twist alone.  The
+        # placement gains of all empty cells come from the precomputed
+        # PLACEMENT_GAIN table, one lookup per line, so only the 8 twists
+        # are scored.
+        #---------------------------------------------------------------------------
+        base = sum(self.line_scores[token])
+        cells = self.cells
+        twist_gain = 0
+        for gameBlock, direction in TWISTS:
+            self._rotate(gameBlock, direction)
+            twist_gain += self._delta(BLOCK_LINES[gameBlock], token)
+            self._rotate(gameBlock, OPPOSITE[direction])
+        gains = PLACEMENT_GAIN[token]
+        place_gain = 0
+        for getter in LINE_GETTERS:
+            place_gain += gains[getter(cells)]
+        empty = cells.count('.')
+        return empty * (len(TWISTS) * base + twist_gain) + len(TWISTS) * place_gain
+
+    def static_score(self, token):
+        return self.line_scoring(token) + self.twist_potential(token)
+
+    def score(self, token):
+        return self.static_score(token) + self.mobility(token)
+
+
+# Evaluation modes, from the exact heuristic to the cheapest:
+#   full   - line score + twist potential + mobility (= sg3824_h)
+#   lazy   - the approx score, replaced by the full score only when it is
+#            within LAZY_MARGIN of the alpha-beta window
+#   approx - line score + twist potential + approx_mobility
+#   static - line score + twist potential
+EVAL_MODES = ("full", "lazy", "approx", "static")
+# About one standard deviation of (full - approx) over random positions
+LAZY_MARGIN = 25000
+
+
+def evaluate(board, token, mode="full", alpha=float('-inf'), beta=float('inf')):
+    evaluator = LineEvaluator(board)
+    if mode == "full":
+        return evaluator.score(token)
+    static = evaluator.static_score(token)
+    if mode == "static":
+        return static
+    estimate = static + evaluator.approx_mobility(token)
+    if mode == "approx":
+        return estimate
+    if mode != "lazy":
+        raise ValueError("Unknown evaluation mode: " + str(mode))
+    if estimate + LAZY_MARGIN <= alpha or estimate - LAZY_MARGIN >= beta:
+        # Far enough outside the window that the exact value would not matter
+        return estimate
+    return static + evaluator.mobility(token)
@@ -1,4 +1,3 @@
-import copy
 import time
 # ---------------------------------------------------------------------------
 # JL Popyack, ported to Python, May 2019, updated Nov 2021. v2 Nov 29, 2021
@@ -12,9 +11,11 @@ descr = {
 
 class Game:
 
-    def __init__(self, initial_board, player1, player2):
+    def __init__(self, initial_board, player1, player2, record=None):
         self.initial_board =initial_board
         self.players = [player1, player2]
+        # records.GameRecordWriter the finished game is appended to, if any
+        self.record = record
 
     def play(self, output=False):
         pb = self.initial_board
@@ -27,16 +28,18 @@ class Game:
             f.write("\n" + str(self.players[0]) + "\n" + str(self.players[1]) + "\n")
 
         numEmpty = pb.empty_cells
+        moves = []
         while( not game_over ):
             move = self.players[currentPlayer].get_move(pb)
             if move == "exit":
                 break
             print( self.players[currentPlayer].player_number + "'s move (" + self.players[currentPlayer].player_type().lower() + " agent): " + move)
+            moves.append(move)
             if (output):
                 f.write(pb.to_string() + "\t" + move + "\n")
             # f.write(pb.toString() + "\t" + move + "\n")
-            new_board = copy.deepcopy(pb)
-            new_board = new_board.apply_move(move,self.players[currentPlayer].token)
+            # apply_move returns a new board, so no copies are needed
+            new_board = pb.apply_move(move,self.players[currentPlayer].token)
             self.players[currentPlayer].explain_move(move, pb) 
             print(new_board)
             numEmpty = numEmpty - 1
@@ -46,7 +49,7 @@ class Game:
             game_over = win0 or win1 or numEmpty==0
             
             currentPlayer = 1 - currentPlayer
-            pb = copy.deepcopy(new_board)
+            pb = new_board
         if not game_over:  # Human player requested "exit"
             print("Exiting game.")
         elif (win0 and win1):
@@ -64,5 +67,18 @@ class Game:
         if (output):
             f.write(pb.to_string() + "\t\n")
             f.close()
+        if self.record is not None:
+            if not game_over:
+                result = None
+            elif win0 and win1:
+                result = '.'
+            elif win0:
+                result = self.players[0].token
+            elif win1:
+                result = self.players[1].token
+            else:
+                result = '.'
+            self.record.write_game(self.initial_board, moves, result,
+                                   meta={"players": [str(player) for player in self.players]})
 
 
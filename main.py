@@ -4,6 +4,10 @@ import sys
 import getopt
 from ec_sg3824 import ec_sg3824
 import agents
+import evalcache
+import book
+import telemetry
+import records
 
 
 # ---------------------------------------------------------------------------
@@ -52,12 +56,50 @@ if __name__ == "__main__":
     # "transcript_" and ending with a timestamp value.  The file contains player 
     # info, followed by lines containing each state as a 36-character string, 
     # followed by the move made.
+    #
+    #  The pvs agent is Alphabeta's search as principal variation search with
+    # aspiration windows, e.g.
+    #   python3 main.py pvs alphabeta -d 3
+    #
+    #  Searching agents (Minimax, Alphabeta, Pvs) can spread their search over several
+    # processes with -w/--workers, e.g. -w 8, and Minimax_mcts its playouts.  The
+    # worker pool is started once per game.
+    #
+    #  Leaf evaluations are cached per agent; -c/--cache <file> shares one cache
+    # between both players and keeps it in the file from one game to the next.
+    #
+    #  -k/--book <file> gives the agents an opening book built with book.py.
+    #
+    #  -r/--record <file> appends the game to a binary game record file (see
+    # records.py, which also converts transcripts to and from it).
+    #
+    #  -m/--telemetry <file> writes one JSON record per move of each searching
+    # agent (nodes per ply, cutoffs, evaluations, time in evaluation and move
+    # generation, ...) to the file, or to stdout with "-m -".
+    #
+    #  -s/--seed <n> seeds the random playouts of minimax_mcts and mcts, so a game
+    # can be replayed (minimax_mcts prints its seed with every move); the same
+    # seed gives the same moves at any -w.
+    #
+    #  -v/--verbose prints the statistics of the agents' search components
+    # (transposition table, evaluation cache, move ordering, ...) after every move.
+    #
+    #  The mcts agent is a UCT tree search that uses the whole time limit (-t)
+    # and keeps its tree from one move to the next, e.g.
+    #   python3 main.py mcts alphabeta -t 10 -d 3
     # --------------------------------------------------------------------------------
 
     
     output = False
     time_limit = 100 # default value
     depth_limit = 1 # default value
+    workers = 1 # default value
+    cache_file = None
+    book_file = None
+    telemetry_file = None
+    record_file = None
+    verbose = False
+    seed = None
     board = pentago.PentagoBoard()
     if len(sys.argv) >= 2 :
         agent1 = sys.argv[1].capitalize()
@@ -67,7 +109,7 @@ if __name__ == "__main__":
         sys.exit()
          
     try:
-        opts, args = getopt.getopt(sys.argv[3:],"ob:t:d:",["output", "board=","time=","depth="])
+        opts, args = getopt.getopt(sys.argv[3:],"ovb:t:d:w:c:k:m:r:s:",["output", "verbose", "seed=", "board=","time=","depth=","workers=","cache=","book=","telemetry=","record="])
     except getopt.GetoptError as err:
         # print help information and exit:
         print(err)  # will print something like "option -a not recognized"
@@ -89,8 +131,30 @@ if __name__ == "__main__":
             else:
                 print("Depth argument should be a digit!")
                 sys.exit(2)
+        elif opt in ("-w", "--workers"):
+            if arg.isdigit() and int(arg) > 0:
+                workers = int(arg)
+            else:
+                print("Workers argument should be a positive digit!")
+                sys.exit(2)
+        elif opt in ("-c", "--cache"):
+            cache_file = arg
+        elif opt in ("-k", "--book"):
+            book_file = arg
+        elif opt in ("-m", "--telemetry"):
+            telemetry_file = arg
+        elif opt in ("-r", "--record"):
+            record_file = arg
         elif opt in ("-o", "--output"):
             output = True
+        elif opt in ("-v", "--verbose"):
+            verbose = True
+        elif opt in ("-s", "--seed"):
+            if arg.isdigit():
+                seed = int(arg)
+            else:
+                print("Seed argument should be a digit!")
+                sys.exit(2)
         else:
             print("Unknown option, " + opt + " " + arg )
 
@@ -102,6 +166,33 @@ if __name__ == "__main__":
         print("Unknown agent(s)! Some options are Human and Random.")
         print("Make sure the spelling is correct.")
         sys.exit(2)
+
+    for player in (player1, player2):
+        if hasattr(player, "search_fixed_depth") or hasattr(player, "playout_chunk"):
+            player.workers = workers
+        player.verbose = verbose
+        if seed is not None:
+            player.seed_playouts(seed)
+
+    if cache_file is not None:
+        # One evaluation cache for both players, loaded from and saved to the file
+        cache = evalcache.EvalCache(path=cache_file)
+        for player in (player1, player2):
+            player.eval_cache = cache
+            if hasattr(player, "minimax_agent"):
+                player.minimax_agent.eval_cache = cache
+
+    if book_file is not None:
+        opening_book = book.OpeningBook(book_file)
+        player1.book = player2.book = opening_book
+
+    search_telemetry = None
+    if telemetry_file is not None:
+        # Only agents that search are instrumented
+        search_telemetry = telemetry.Telemetry(telemetry.open_sink(telemetry_file))
+        for player in (player1, player2):
+            if hasattr(player, "search_fixed_depth") or hasattr(player, "mcts") or hasattr(player, "tree"):
+                search_telemetry.attach(player)
         
     print( "\n-------------------\nWelcome to Pentago!\n-------------------" )
     print("\n" + str(player1) + "\n" + str(player2) + "\n")
@@ -113,5 +204,13 @@ if __name__ == "__main__":
 
     agent = ec_sg3824(player_number="1", token='w', time_limit=100)
 
-    game = game.Game(board, player1, player2)
-    game.play(output)
\ No newline at end of file
+    record = records.GameRecordWriter(record_file) if record_file is not None else None
+    game = game.Game(board, player1, player2, record)
+    game.play(output)
+    if record is not None:
+        record.close()
+
+    player1.close()
+    player2.close()
+    if search_telemetry is not None:
+        search_telemetry.close()
\ No newline at end of file
@@ -0,0 +1,111 @@
+import pentago
+import winlines
+
+# ---------------------------------------------------------------------------
+# Move ordering for the alpha-beta style searchers.
+# Moves are searched in this order:
+#   1. immediate wins for the side to move
+#   2. forced blocks: placements on the cells where the opponent wins next
+#   3. the principal-variation move, then the transposition-table move
+#   4. the killer moves of this ply (moves that caused a cutoff in a sibling)
+#   5. everything else by history score, indexed by move code, i.e. by
+#      (placement cell, rotation)
+# Killers and history are not used at the root (ply 0).
+# The orderer also counts beta cutoffs and how many of them came from the
+# first move searched, the usual measure of how well ordering works.
+# ---------------------------------------------------------------------------
+
+KILLER_SLOTS = 2
+MAX_PLY = 64
+
+
+class MoveOrderer:
+
+    def __init__(self, max_ply=MAX_PLY, killer_slots=KILLER_SLOTS):
+        self.killer_slots = killer_slots
+        self.killers = [[None] * killer_slots for _ in range(max_ply)]
+        self.history = [0] * pentago.NUM_MOVES
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0               # nodes whose moves were ordered
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        #---------------------------------------------------------------------------
+        # Killers are position specific and are cleared; history is kept but
+        # halved so that older searches count less.
+        #---------------------------------------------------------------------------
+        for slots in self.killers:
+            for k in range(self.killer_slots):
+                slots[k] = None
+        self.history = [h >> 1 for h in self.history]
+
+    def order(self, board, moves, token, ply, tt_move=None, pv_move=None):
+        #---------------------------------------------------------------------------
+        # Returns moves (integer codes) in search order for token to move.
+        #---------------------------------------------------------------------------
+        self.nodes += 1
+        opponent = 'b' if token == 'w' else 'w'
+        own = board.mask(token)
+        opp = board.mask(opponent)
+
+        first = []
+        for move in winlines.winning_moves(own, opp):
+            first.append(move)
+        block_cells = winlines.threat_cells(opp, own)
+        if block_cells:
+            for move in moves:
+                if block_cells >> (move >> 3) & 1:
+                    first.append(move)
+        for move in (pv_move, tt_move):
+            if move is not None:
+                first.append(move)
+        if 0 < ply < len(self.killers):
+            for move in self.killers[ply]:
+                if move is not None:
+                    first.append(move)
+
+        ordered = []
+        seen = set()
+        legal = set(moves)
+        for move in first:
+            if move not in seen and move in legal:
+                seen.add(move)
+                ordered.append(move)
+        rest = [move for move in moves if move not in seen]
+        if ply > 0:
+            # The root keeps generation order after the PV move, so that its
+            # order (and tie-breaking) does not depend on search history
+            rest.sort(key=self.history.__getitem__, reverse=True)
+        return ordered + rest
+
+    def record_cutoff(self, move, ply, depth, index):
+        #---------------------------------------------------------------------------
+        # Called when move (searched as the index-th move) caused a cutoff.
+        #---------------------------------------------------------------------------
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        self.history[move] += depth * depth
+        if ply < len(self.killers):
+            slots = self.killers[ply]
+            if slots[0] != move:
+                slots.insert(0, move)
+                slots.pop()
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self):
+        return {
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+        }
+
+    def __str__(self):
+        return ("Ordering: %d cutoffs, %.1f%% on the first move"
+                % (self.cutoffs, 100 * self.first_move_cutoff_rate()))
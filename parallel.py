@@ -0,0 +1,241 @@
+import concurrent.futures
+import multiprocessing
+
+import agents
+import bitboard
+
+# ---------------------------------------------------------------------------
+# Root-parallel search for Alphabeta and Minimax, and parallel playouts for
+# Minimax_mcts (ParallelPlayouts below).
+# The root moves of one iteration are spread over a process pool; each worker
+# keeps its own copy of the agent (transposition table, move ordering), built
+# with the agent's settings (settings_of), for the whole game.  For alpha-beta, the first root move is searched alone to
+# get a bound, the rest in parallel, and every worker starts from the best
+# score found so far, shared through a synchronized array.
+#
+# The result is the same as the serial search at the same depth: the best
+# score, ties going to the earliest move in root order, and for alpha-beta the
+# first move reaching WINNING_SCORE.  A move searched before the current best
+# in root order is given a window one below the shared bound, so an equal
+# score is still found exactly and wins the tie as it would serially.
+# ---------------------------------------------------------------------------
+
+_agent = None
+_shared = None      # [best score so far, root index of that move]
+_search_id = None
+# Class settings not copied to the workers: they run no pool of their own
+# and do not consult the book
+LOCAL_SETTINGS = ("parallel", "workers", "book")
+
+
+def settings_of(agent):
+    #---------------------------------------------------------------------------
+    # The agent's settings: every class attribute that is not a method, with
+    # the value the agent has (an instance may override it, e.g. arena.py
+    # options), so that a worker's agent searches exactly like agent.
+    #---------------------------------------------------------------------------
+    settings = {}
+    for name in dir(agent.__class__):
+        if name.startswith("_") or name in LOCAL_SETTINGS or callable(getattr(agent.__class__, name)):
+            continue
+        settings[name] = getattr(agent, name)
+    return settings
+
+
+def _make_agent(agent_class, args, settings):
+    agent = agent_class(*args)
+    for name, value in settings.items():
+        setattr(agent, name, value)
+    return agent
+
+
+def _init_worker(agent_class, args, settings, shared):
+    global _agent, _shared
+    _agent = _make_agent(agent_class, args, settings)
+    _shared = shared
+
+
+def _init_playout_worker(agent_class, args, settings):
+    global _agent
+    _agent = _make_agent(agent_class, args, settings)
+
+
+def _begin(search_id):
+    # First task of a new get_move in this worker
+    global _search_id
+    if search_id != _search_id:
+        _search_id = search_id
+        _agent.tt.new_search()
+        if hasattr(_agent, "orderer"):
+            _agent.orderer.new_search()
+
+
+def _alphabeta_root_move(board_string, move, index, depth, deadline, search_id):
+    #---------------------------------------------------------------------------
+    # Returns (index, score or None on timeout, True if the score is exact,
+    # nodes searched).
+    #---------------------------------------------------------------------------
+    _begin(search_id)
+    _agent.deadline = deadline
+    _agent.nodes = 0
+    with _shared.get_lock():
+        alpha, best_index = _shared[0], _shared[1]
+    bound = min(alpha, _agent.WINNING_SCORE - 1)
+    if index < best_index:
+        bound -= 1
+    board = bitboard.BitBoard(board_string)
+    board.make_move(move, _agent.token)
+    try:
+        value, _ = _agent.alphabeta(board, depth - 1, bound, float('inf'), False, 1, False)
+    except agents.SearchTimeout:
+        return index, None, False, _agent.nodes
+    exact = value > bound
+    if exact:
+        with _shared.get_lock():
+            if value > _shared[0] or (value == _shared[0] and index < _shared[1]):
+                _shared[0] = value
+                _shared[1] = index
+    return index, value, exact, _agent.nodes
+
+
+def _minimax_root_move(board_string, move, index, depth, search_id):
+    _begin(search_id)
+    board = bitboard.BitBoard(board_string)
+    board.make_move(move, _agent.token)
+    value, _ = _agent.minimax(board, depth - 1, False)
+    return index, value, True, 0
+
+
+class RootParallelSearch:
+#--------------------------------------------------------------------------------
+# Process pool owned by one agent.  The pool is started on the first search
+# and kept until close(), so it is created once per game rather than per move.
+#--------------------------------------------------------------------------------
+
+    def __init__(self, agent, workers):
+        self.agent = agent
+        self.workers = workers
+        self.pool = None
+        self.shared = None
+        self.search_id = 0
+
+    def start(self):
+        if self.pool is None:
+            agent = self.agent
+            self.shared = multiprocessing.Array('d', [float('-inf'), float('inf')])
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(agent.__class__, (agent.player_number, agent.token, agent.depth_limit, agent.time_limit),
+                          settings_of(agent), self.shared))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def new_search(self):
+        self.search_id += 1
+
+    def _reset_bound(self):
+        with self.shared.get_lock():
+            self.shared[0] = float('-inf')
+            self.shared[1] = float('inf')
+
+    def alphabeta_root(self, board, depth, root_moves, deadline):
+        #---------------------------------------------------------------------------
+        # Search root_moves (in root order) to depth.  Returns (score, move,
+        # nodes) or raises agents.SearchTimeout if the iteration did not finish.
+        #---------------------------------------------------------------------------
+        self.start()
+        self._reset_bound()
+        board_string = board.to_string()
+        submit = lambda index: self.pool.submit(_alphabeta_root_move, board_string, root_moves[index],
+                                                index, depth, deadline, self.search_id)
+        results = [submit(0).result()]
+        if results[0][1] is None:
+            raise agents.SearchTimeout()
+        if results[0][1] < self.agent.WINNING_SCORE:
+            futures = [submit(index) for index in range(1, len(root_moves))]
+            results += [future.result() for future in futures]
+        if any(value is None for _, value, _, _ in results):
+            raise agents.SearchTimeout()
+
+        nodes = sum(n for _, _, _, n in results)
+        exact = [(index, value) for index, value, is_exact, _ in results if is_exact]
+        wins = [index for index, value in exact if value >= self.agent.WINNING_SCORE]
+        if wins:
+            index = min(wins)
+            return dict(exact)[index], root_moves[index], nodes
+        best_index, best_value = min(exact, key=lambda item: (-item[1], item[0]))
+        return best_value, root_moves[best_index], nodes
+
+    def minimax_root(self, board, depth, root_moves):
+        self.start()
+        board_string = board.to_string()
+        futures = [self.pool.submit(_minimax_root_move, board_string, move, index, depth, self.search_id)
+                   for index, move in enumerate(root_moves)]
+        results = [future.result() for future in futures]
+        best_index, best_value = min(((index, value) for index, value, _, _ in results),
+                                     key=lambda item: (-item[1], item[0]))
+        return best_value, root_moves[best_index]
+
+
+def _playout_chunk(board_string, move, index, count, seed):
+    board = bitboard.BitBoard(board_string)
+    board.make_move(move, _agent.token)
+    return index, _agent.playout_chunk(board, count, seed)
+
+
+class ParallelPlayouts:
+#--------------------------------------------------------------------------------
+# Process pool running the playout chunks of Minimax_mcts.  Every chunk has
+# its own seed (Minimax_mcts.playout_tasks) and the win counts are summed per
+# candidate, so the result does not depend on the number of workers or on
+# the order in which chunks finish.
+#--------------------------------------------------------------------------------
+
+    def __init__(self, agent, workers):
+        self.agent = agent
+        self.workers = workers
+        self.pool = None
+
+    def start(self):
+        if self.pool is None:
+            agent = self.agent
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_playout_worker,
+                initargs=(agent.__class__, (agent.player_number, agent.token, agent.depth_limit, agent.time_limit,
+                                            agent.num_playouts, agent.batched), settings_of(agent)))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def run(self, board, moves, tasks):
+        #---------------------------------------------------------------------------
+        # tasks are (candidate index, playouts, seed); returns the number of
+        # wins per candidate move.
+        #---------------------------------------------------------------------------
+        self.start()
+        board_string = board.to_string()
+        futures = [self.pool.submit(_playout_chunk, board_string, moves[index], index, count, seed)
+                   for index, count, seed in tasks]
+        wins = [0] * len(moves)
+        for future in futures:
+            index, chunk_wins = future.result()
+            wins[index] += chunk_wins
+        return wins
+
+
+def check_against_serial(agent_class, board, depth, workers=2, token='w'):
+    #---------------------------------------------------------------------------
+    # Runs one fixed-depth search serially and in parallel with fresh agents
+    # and returns both (score, move) results; they should be equal.
+    #---------------------------------------------------------------------------
+    serial = agent_class("Serial", token, depth, float('inf'))
+    parallel = agent_class("Parallel", token, depth, float('inf'), workers=workers)
+    try:
+        return serial.search_fixed_depth(board, depth), parallel.search_fixed_depth(board, depth)
+    finally:
+        parallel.close()
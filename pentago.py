@@ -1,4 +1,4 @@
-import copy
+import zobrist
 
 # ---------------------------------------------------------------------------
 # JL Popyack, ported to Python, May 2019, updated Nov 2021. v2 Nov 29, 2021
@@ -6,6 +6,61 @@ import copy
 # ---------------------------------------------------------------------------
 
 
+#--------------------------------------------------------------------------------
+# Move encoding:
+# Internally a move is the integer cell*8 + rotation, where cell = i*6 + j is the
+# cell that receives the token and rotation = (block-1)*2 + (0 for L, 1 for R).
+# Codes increase in the same order as the moves returned by get_moves, and
+# MOVE_TEXT / MOVE_CODE translate between codes and the "1/5 3L" notation used
+# at the human, agent and transcript boundaries.
+#--------------------------------------------------------------------------------
+NUM_CELLS = 36
+NUM_ROTATIONS = 8
+NUM_MOVES = NUM_CELLS * NUM_ROTATIONS
+
+
+def _build_move_tables():
+	text = []
+	parts = []
+	for code in range(NUM_MOVES):
+		cell, rotation = divmod(code, NUM_ROTATIONS)
+		i, j = divmod(cell, 6)
+		gameBlock = (i // 3)*2 + (j // 3) + 1
+		position = (i % 3)*3 + (j % 3) + 1
+		rotBlock = rotation // 2 + 1
+		clockwise = rotation % 2 == 1
+		text.append(str(gameBlock) + "/" + str(position) + " " + str(rotBlock) + ("R" if clockwise else "L"))
+		parts.append((i, j, rotBlock, clockwise))
+	codes = {}
+	for code, move in enumerate(text):
+		codes[move] = code
+		codes[move[:5] + move[5].lower()] = code
+	return text, codes, parts
+
+
+MOVE_TEXT, MOVE_CODE, MOVE_PARTS = _build_move_tables()
+# Codes of the 8 moves that place a token on each cell.
+CELL_MOVES = [tuple(range(cell*NUM_ROTATIONS, (cell+1)*NUM_ROTATIONS)) for cell in range(NUM_CELLS)]
+
+
+def encode_move(move):
+	#---------------------------------------------------------------------------
+	# Accepts a move code or its text form ("1/5 3L") and returns the code.
+	#---------------------------------------------------------------------------
+	if move.__class__ is int:
+		return move
+	return MOVE_CODE[move]
+
+
+def decode_move(move):
+	#---------------------------------------------------------------------------
+	# Accepts a move code or its text form and returns the text form.
+	#---------------------------------------------------------------------------
+	if move.__class__ is int:
+		return MOVE_TEXT[move]
+	return move
+
+
 class PentagoBoard:
 #--------------------------------------------------------------------------------
 # Basic elements of game:
@@ -35,6 +90,9 @@ class PentagoBoard:
 			  for row in range(self.BOARD_SIZE)] 
 			self.empty_cells = board.count(".")
 
+		# Zobrist key of the position, kept up to date by make/unmake_move
+		self.hash = zobrist.hash_cells(board)
+
 
 	def __str__ (self):
 		outstr = "+-------+-------+\n"
@@ -56,46 +114,32 @@ class PentagoBoard:
 		return "".join(item for row in self.board for item in row) 
 
 
-	def get_moves(self):
+	def get_moves(self, encoded=False):
 	#---------------------------------------------------------------------------
 	# Determines all legal moves for player with current board,
-	# and returns them in moveList.
+	# and returns them in moveList.  For each empty cell (row-major order) the
+	# token can be placed there and any block (1..4) rotated left or right.
+	# With encoded=True the moves are returned as integer codes (see
+	# MOVE_TEXT), otherwise in text form, e.g. "1/5 3L".
 	#---------------------------------------------------------------------------
 		moveList = [ ]
-		for i in range(self.BOARD_SIZE):
-			for j in range(self.BOARD_SIZE):
-				if self.board[i][j] == ".":
-				#---------------------------------------------------------------
-				#  For each empty cell on the grid, determine its block (1..4)
-				#  and position (1..9)  (1..GRID_SIZE^2)
-				#---------------------------------------------------------------
-					gameBlock = (i // self.GRID_SIZE)*2 + (j // self.GRID_SIZE) + 1
-					position  = (i%self.GRID_SIZE)*self.GRID_SIZE + (j%self.GRID_SIZE) + 1
-					pos = str(gameBlock) + "/" + str(position) + " "
-				#---------------------------------------------------------------
-				#  For each block, can place a token in the given cell and
-				#  rotate the block either left or right.
-				#---------------------------------------------------------------
-					numBlocks = (self.BOARD_SIZE // self.GRID_SIZE)**2  # =4 
-					for k in range(numBlocks):  
-						block = str(k+1)
-						moveList.append(pos+block+"L")
-						moveList.append(pos+block+"R")
-
-		return moveList
+		cell = 0
+		for row in self.board:
+			for item in row:
+				if item == ".":
+					moveList.extend(CELL_MOVES[cell])
+				cell += 1
+
+		if encoded:
+			return moveList
+		return [MOVE_TEXT[code] for code in moveList]
 
 	def rotate_left(self,gameBlock):
 	#---------------------------------------------------------------------------
 	# Rotate gameBlock counter-clockwise.  gameBlock is in [1..4].
 	#---------------------------------------------------------------------------
-		rotLeft = copy.deepcopy(self)
-
-		rowOffset = ((gameBlock-1)//2)*self.GRID_SIZE
-		colOffset = ((gameBlock-1)%2)*self.GRID_SIZE
-		for i in range(0+rowOffset,self.GRID_SIZE+rowOffset):
-			for j in range(0+colOffset,self.GRID_SIZE+colOffset):
-				rotLeft.board[2-j+rowOffset+colOffset][i-rowOffset+colOffset] = self.board[i][j]
-
+		rotLeft = self.copy()
+		rotLeft._rotate_in_place(gameBlock, False)
 		return rotLeft
 
 
@@ -103,39 +147,84 @@ class PentagoBoard:
 	#---------------------------------------------------------------------------
 	# Rotate gameBlock clockwise.  gameBlock is in [1..4].
 	#---------------------------------------------------------------------------
-		rotRight = copy.deepcopy(self)
-
-		rowOffset = ((gameBlock-1)//2)*self.GRID_SIZE
-		colOffset = ((gameBlock-1)%2)*self.GRID_SIZE
-		for i in range(0+rowOffset,self.GRID_SIZE+rowOffset):
-			for j in range(0+colOffset,self.GRID_SIZE+colOffset):
-				rotRight.board[j+rowOffset-colOffset][2-i+rowOffset+colOffset] = self.board[i][j]
-
+		rotRight = self.copy()
+		rotRight._rotate_in_place(gameBlock, True)
 		return rotRight
 
 
 	def apply_move(self, move, token):
 	#---------------------------------------------------------------------------
-	# Perform the given move, and update board.
+	# Perform the given move (text or code), and return the updated board.
 	#---------------------------------------------------------------------------
+		newBoard = self.copy()
+		newBoard.make_move(move, token)
+		return newBoard
 
-		gameBlock = int(move[0])  # 1,2,3,4
-		position = int(move[2])   # 1,2,3,4,5,6,7,8,9
-		rotBlock = int(move[4])   # 1,2,3,4
-		direction = move[5]       # L,R
 
-		i = (position-1)//self.GRID_SIZE + self.GRID_SIZE*((gameBlock-1)//2) ;
-		j = ((position-1)%self.GRID_SIZE) + self.GRID_SIZE*((gameBlock-1)%2) ;
+	def copy(self):
+	#---------------------------------------------------------------------------
+	# Independent copy of the board (cheaper than copy.deepcopy).
+	#---------------------------------------------------------------------------
+		newBoard = PentagoBoard.__new__(PentagoBoard)
+		newBoard.__dict__.update(self.__dict__)
+		newBoard.board = [row[:] for row in self.board]
+		return newBoard
 
-		newBoard = copy.deepcopy(self)
-		newBoard.board[i][j] = token
-		
-		if( direction=='r' or direction=='R' ):
-			newBoard = newBoard.rotate_right(rotBlock) ;
-		else: # direction=='l' or direction=='L'
-			newBoard = newBoard.rotate_left(rotBlock) ;
 
-		return newBoard
+	def _rotate_in_place(self, gameBlock, clockwise):
+	#---------------------------------------------------------------------------
+	# Rotate gameBlock of this board without allocating a new board, and
+	# update the Zobrist key for the stones that moved.  Local cell (r,c) goes
+	# to (c,2-r) clockwise and to (2-c,r) counter-clockwise.
+	#---------------------------------------------------------------------------
+		G = self.GRID_SIZE
+		N = self.BOARD_SIZE
+		keys = zobrist.KEYS
+		rowOffset = ((gameBlock-1)//2)*G
+		colOffset = ((gameBlock-1)%2)*G
+		block = [self.board[rowOffset+r][colOffset:colOffset+G] for r in range(G)]
+		h = self.hash
+		for r in range(G):
+			for c in range(G):
+				if clockwise:
+					i, j = rowOffset+c, colOffset+2-r
+				else:
+					i, j = rowOffset+2-c, colOffset+r
+				item = block[r][c]
+				self.board[i][j] = item
+				if item != '.':
+					h ^= keys[item][(rowOffset+r)*N + colOffset+c] ^ keys[item][i*N + j]
+		self.hash = h
+
+
+	def make_move(self, move, token):
+	#---------------------------------------------------------------------------
+	# Perform the given move (text or code) on this board (in place) and
+	# return an undo record for unmake_move.  Searches use make_move/unmake_move
+	# so that a whole search runs on one board object instead of copying per
+	# node.
+	#---------------------------------------------------------------------------
+		if move.__class__ is not int:
+			move = MOVE_CODE[move]
+		undo = MOVE_PARTS[move]
+		i, j, rotBlock, clockwise = undo
+
+		self.board[i][j] = token
+		self.hash ^= zobrist.KEYS[token][i*self.BOARD_SIZE + j]
+		self._rotate_in_place(rotBlock, clockwise)
+		self.empty_cells -= 1
+		return undo
+
+
+	def unmake_move(self, undo):
+	#---------------------------------------------------------------------------
+	# Take back the move described by an undo record from make_move.
+	#---------------------------------------------------------------------------
+		i, j, rotBlock, clockwise = undo
+		self._rotate_in_place(rotBlock, not clockwise)
+		self.hash ^= zobrist.KEYS[self.board[i][j]][i*self.BOARD_SIZE + j]
+		self.board[i][j] = '.'
+		self.empty_cells += 1
 
 
 	def get_diagonals(self):
@@ -150,6 +239,21 @@ class PentagoBoard:
 		]
 
 
+	def mask(self, token):
+	#---------------------------------------------------------------------------
+	# Bitmask of the cells holding token, cell [i][j] being bit i*6+j.
+	# Used by the line-mask win detection in winlines.py.
+	#---------------------------------------------------------------------------
+		bits = 0
+		k = 0
+		for row in self.board:
+			for cell in row:
+				if cell == token:
+					bits |= 1 << k
+				k += 1
+		return bits
+
+
 	def is_full(self):
 		# Return True if there are no empty cells left on the board
 		return all(cell != '.' for row in self.board for cell in row)
@@ -0,0 +1,239 @@
+import hashlib
+import random
+
+import bitboard
+import pentago
+import winlines
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ---------------------------------------------------------------------------
+# Batched random playouts.
+# With NumPy, all games of a batch are advanced together: the boards are an
+# N x 36 array (0 empty, 1 white, 2 black), a legal cell is sampled per game
+# by taking the largest random key over the empty cells, the move is applied
+# as one gather through a per-move cell permutation (placement, then the
+# quadrant rotation), and wins are found with one product against the 32
+# win-line masks.  Without NumPy the same counts are produced one game at a
+# time with random_playout.
+#
+# Results follow outcome(): five for both players is a draw, as is a full
+# board with no five.
+#
+# check_batched_against_serial (python3 playouts.py) checks that the serial
+# and batched playouts of Minimax_mcts give the same counts for a seed.
+# ---------------------------------------------------------------------------
+
+HAVE_NUMPY = np is not None
+DRAW = '.'
+NUM_CELLS = bitboard.NUM_CELLS
+# Games advanced together; bounds the memory of one batch
+CHUNK_SIZE = 4096
+
+EMPTY, WHITE, BLACK = 0, 1, 2
+RUNNING, DRAWN = -1, 0
+TOKEN_VALUE = {'w': WHITE, 'b': BLACK}
+
+
+def derive_seed(master_seed, *path):
+    #---------------------------------------------------------------------------
+    # Seed of one random stream (e.g. one chunk of playouts), determined only
+    # by master_seed and path, so streams can be split across processes and
+    # still be reproduced.
+    #---------------------------------------------------------------------------
+    text = repr((master_seed,) + path).encode()
+    return int.from_bytes(hashlib.sha256(text).digest()[:8], "little")
+
+
+def opponent_of(token):
+    return 'b' if token == 'w' else 'w'
+
+
+def outcome(board):
+    #---------------------------------------------------------------------------
+    # Winner token, DRAW, or None while the game goes on.  Both players having
+    # five (possible after a rotation) is a draw, as in game.Game.  board is
+    # a BitBoard or a PentagoBoard.
+    #---------------------------------------------------------------------------
+    white = winlines.has_five(board.mask('w'))
+    black = winlines.has_five(board.mask('b'))
+    if white and black:
+        return DRAW
+    if white:
+        return 'w'
+    if black:
+        return 'b'
+    if board.empty_cells == 0:
+        return DRAW
+    return None
+
+
+def random_playout(board, token, rng=random):
+    #---------------------------------------------------------------------------
+    # Play random moves on board, token first, until the game ends; returns
+    # the outcome.  The board is restored before returning.
+    #---------------------------------------------------------------------------
+    undo_stack = []
+    result = outcome(board)
+    while result is None:
+        move = rng.choice(board.get_moves(encoded=True))
+        undo_stack.append(board.make_move(move, token))
+        result = outcome(board)
+        token = opponent_of(token)
+    while undo_stack:
+        board.unmake_move(undo_stack.pop())
+    return result
+
+
+def _build_move_permutations():
+    #---------------------------------------------------------------------------
+    # MOVE_PERM[code][k] = cell whose contents move to cell k when the block
+    # of move code is rotated.  Local (r,c) goes to (2-c,r) on a left turn and
+    # (c,2-r) on a right turn, as in PentagoBoard.
+    #---------------------------------------------------------------------------
+    perms = []
+    for i, j, rotBlock, clockwise in pentago.MOVE_PARTS:
+        perm = list(range(NUM_CELLS))
+        cells = bitboard._quadrant_cells(rotBlock)
+        rowOffset, colOffset = cells[0]
+        for si, sj in cells:
+            r, c = si - rowOffset, sj - colOffset
+            dr, dc = (c, 2 - r) if clockwise else (2 - c, r)
+            perm[bitboard.cell_index(rowOffset + dr, colOffset + dc)] = bitboard.cell_index(si, sj)
+        perms.append(perm)
+    return perms
+
+
+MOVE_PERM = _build_move_permutations()
+# LINE_MATRIX[k][l] = 1 if cell k is on win line l
+LINE_MATRIX = [[m >> k & 1 for m in winlines.WIN_MASKS] for k in range(NUM_CELLS)]
+
+if HAVE_NUMPY:
+    _MOVE_PERM = np.array(MOVE_PERM, dtype=np.intp)
+    _LINE_MATRIX = np.array(LINE_MATRIX, dtype=np.float32)
+
+
+def _outcome(cells):
+    # Per game: RUNNING, DRAWN, WHITE or BLACK
+    white = ((cells == WHITE).astype(np.float32) @ _LINE_MATRIX == winlines.WIN_LENGTH).any(axis=1)
+    black = ((cells == BLACK).astype(np.float32) @ _LINE_MATRIX == winlines.WIN_LENGTH).any(axis=1)
+    full = (cells != EMPTY).all(axis=1)
+    result = np.full(len(cells), RUNNING, dtype=np.int8)
+    result[full] = DRAWN
+    result[white] = WHITE
+    result[black] = BLACK
+    result[white & black] = DRAWN
+    return result
+
+
+def _run_batch(cells, to_move, rng):
+    #---------------------------------------------------------------------------
+    # Play every game of cells (N x 36, modified in place) to the end; to_move
+    # holds the side to move per game.  Returns the outcome per game.
+    #---------------------------------------------------------------------------
+    result = _outcome(cells)
+    while True:
+        active = np.flatnonzero(result == RUNNING)
+        if active.size == 0:
+            return result
+        boards = cells[active]
+        keys = rng.random(boards.shape)
+        keys[boards != EMPTY] = -1.0
+        cell = keys.argmax(axis=1)
+        rotation = rng.integers(0, pentago.NUM_ROTATIONS, size=active.size)
+        boards[np.arange(active.size), cell] = to_move[active]
+        boards = np.take_along_axis(boards, _MOVE_PERM[cell * pentago.NUM_ROTATIONS + rotation], axis=1)
+        cells[active] = boards
+        to_move[active] = WHITE + BLACK - to_move[active]
+        result[active] = _outcome(boards)
+
+
+def _board_cells(board):
+    white = board.mask('w')
+    black = board.mask('b')
+    return [WHITE if white >> k & 1 else (BLACK if black >> k & 1 else EMPTY) for k in range(NUM_CELLS)]
+
+
+def _counts_numpy(boards, to_move, num_playouts, token, seed):
+    rng = np.random.default_rng(seed)
+    starts = np.array([_board_cells(board) for board in boards], dtype=np.int8)
+    own = TOKEN_VALUE[token]
+    opp = WHITE + BLACK - own
+    counts = np.zeros((len(boards), 3), dtype=np.int64)
+    games = np.repeat(np.arange(len(boards)), num_playouts)
+    for first in range(0, len(games), CHUNK_SIZE):
+        index = games[first:first + CHUNK_SIZE]
+        result = _run_batch(starts[index], np.full(len(index), TOKEN_VALUE[to_move], dtype=np.int8), rng)
+        counts[:, 0] += np.bincount(index[result == own], minlength=len(boards))
+        counts[:, 1] += np.bincount(index[result == DRAWN], minlength=len(boards))
+        counts[:, 2] += np.bincount(index[result == opp], minlength=len(boards))
+    return [tuple(int(n) for n in row) for row in counts]
+
+
+def _counts_python(boards, to_move, num_playouts, token, seed):
+    rng = random.Random(seed)
+    counts = []
+    for board in boards:
+        board = bitboard.BitBoard.from_masks(board.mask('w'), board.mask('b'))
+        wins = draws = losses = 0
+        for _ in range(num_playouts):
+            result = random_playout(board, to_move, rng)
+            if result == token:
+                wins += 1
+            elif result == DRAW:
+                draws += 1
+            else:
+                losses += 1
+        counts.append((wins, draws, losses))
+    return counts
+
+
+def playout_counts(boards, to_move, num_playouts, token, seed=None, use_numpy=None):
+    #---------------------------------------------------------------------------
+    # Runs num_playouts random games from each board (any object with
+    # mask(token)), to_move playing first.  Returns one (wins, draws, losses)
+    # tuple per board, seen from token.  The same seed gives the same counts;
+    # the NumPy and pure-Python engines use different random streams.
+    #---------------------------------------------------------------------------
+    if use_numpy is None:
+        use_numpy = HAVE_NUMPY
+    if use_numpy and not HAVE_NUMPY:
+        raise ImportError("NumPy is not installed")
+    if not boards or num_playouts <= 0:
+        return [(0, 0, 0) for _ in boards]
+    engine = _counts_numpy if use_numpy else _counts_python
+    return engine(boards, to_move, num_playouts, token, seed)
+
+
+def check_batched_against_serial(start="", seed=42, num_playouts=20, token='w'):
+    #---------------------------------------------------------------------------
+    # Plays one move of Minimax_mcts from start (a 36-character string), on
+    # a BitBoard and on a PentagoBoard (what game.Game passes), serially and
+    # batched with the pure-Python engine and the same seed.  Returns
+    # (candidates, wins per candidate, move); raises AssertionError if the
+    # four runs disagree.
+    #---------------------------------------------------------------------------
+    import agents
+    import pentago
+
+    results = []
+    for board_class in (bitboard.BitBoard, pentago.PentagoBoard):
+        for batched in (False, True):
+            player = agents.Minimax_mcts("Check", token, 1, float('inf'), num_playouts=num_playouts,
+                                         batched=batched, seed=seed)
+            player.use_numpy = False
+            player.mcts(board_class(start))
+            results.append((player.candidates, player.wins, player.move_text(player.best_move)))
+            player.close()
+    if any(result != results[0] for result in results):
+        raise AssertionError("serial and batched playouts differ: %s" % (results,))
+    return results[0]
+
+
+if __name__ == "__main__":
+    for start in ("", "......" ".w..b." "......" "...w.." ".b...." "......"):
+        moves, wins, move = check_batched_against_serial(start)
+        print("Serial and batched playouts agree on %r: %s, %s" % (start, wins, move))
@@ -0,0 +1,357 @@
+# ---------------------------------------------------------------------------
+# Binary game records.
+# Many games in one appendable file: an 8-byte header (magic, version,
+# reserved) followed by one block per game:
+#   white mask, black mask of the start position, side to move first,
+#   result, number of moves n, length m of the metadata  (struct GAME)
+#   n move codes (uint16, see pentago.MOVE_CODE)
+#   m bytes of metadata (UTF-8 JSON, e.g. the players)
+# A ply costs 2 bytes instead of the 36-character board string and move of
+# a text transcript.  Next to the file, <file>.idx holds the byte offset of
+# every game (uint64); a reader rebuilds it by scanning the blocks if it is
+# missing or stale.
+#
+# GameRecordWriter buffers whole games and writes them in large chunks;
+# game.Game uses it when given a writer (main.py -r).  GameRecordReader maps
+# the file with mmap and decodes games, or the positions of games, lazily.
+# Text transcripts (Game.play with output) convert both ways:
+#   python3 records.py pack <record file> transcript_*.txt
+#   python3 records.py unpack <record file> <directory>
+#   python3 records.py info <record file>
+# ---------------------------------------------------------------------------
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+import bitboard
+import pentago
+import playouts
+
+MAGIC = b"PR"
+VERSION = 1
+HEADER = struct.Struct("<2sHI")
+# start white mask, start black mask, first to move (0 white, 1 black),
+# result, number of moves, metadata length
+GAME = struct.Struct("<QQBBHI")
+MOVE = struct.Struct("<H")
+OFFSET = struct.Struct("<Q")
+SIDES = ('w', 'b')
+# Result codes: unfinished (e.g. a human typed exit), white, black, draw
+RESULTS = (None, 'w', 'b', playouts.DRAW)
+BUFFER_BYTES = 1 << 16
+INDEX_SUFFIX = ".idx"
+
+
+class GameRecord:
+#--------------------------------------------------------------------------------
+# One decoded game.  moves are integer move codes.
+#--------------------------------------------------------------------------------
+
+    __slots__ = ("white", "black", "first", "result", "moves", "meta")
+
+    def __init__(self, white, black, first, result, moves, meta):
+        self.white = white
+        self.black = black
+        self.first = first
+        self.result = result
+        self.moves = moves
+        self.meta = meta
+
+    def start_board(self):
+        return bitboard.BitBoard.from_masks(self.white, self.black)
+
+    def positions(self):
+        #---------------------------------------------------------------------------
+        # Yield (board, token to move, move code) for every ply; the board is
+        # one object updated in place, so copy it to keep it.
+        #---------------------------------------------------------------------------
+        board = self.start_board()
+        token = self.first
+        for move in self.moves:
+            yield board, token, move
+            board.make_move(move, token)
+            token = playouts.opponent_of(token)
+
+    def final_board(self):
+        board = self.start_board()
+        token = self.first
+        for move in self.moves:
+            board.make_move(move, token)
+            token = playouts.opponent_of(token)
+        return board
+
+
+def encode_game(start, moves, result=None, first='w', meta=None):
+    #---------------------------------------------------------------------------
+    # Bytes of one game block.  start is a board (anything with mask()) or a
+    # 36-character string; moves are move codes or text moves.
+    #---------------------------------------------------------------------------
+    if isinstance(start, str):
+        start = bitboard.BitBoard(start)
+    codes = array.array("H", [move if move.__class__ is int else pentago.MOVE_CODE[move] for move in moves])
+    if sys.byteorder != "little":
+        codes.byteswap()
+    text = json.dumps(meta, sort_keys=True).encode() if meta is not None else b""
+    return (GAME.pack(start.mask('w'), start.mask('b'), SIDES.index(first), RESULTS.index(result), len(codes),
+                      len(text))
+            + codes.tobytes() + text)
+
+
+class GameRecordWriter:
+
+    def __init__(self, path, buffer_bytes=BUFFER_BYTES):
+        #---------------------------------------------------------------------------
+        # Opens path for appending, creating it (and its index) if needed.
+        #---------------------------------------------------------------------------
+        self.path = path
+        self.buffer_bytes = buffer_bytes
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(HEADER.pack(MAGIC, VERSION, 0))
+            index = open(path + INDEX_SUFFIX, "wb")
+        else:
+            _check_header(path)
+            if not _index_valid(path):
+                _write_index(path, _scan_offsets(path))
+            index = open(path + INDEX_SUFFIX, "ab")
+        self.index = index
+        self.offset = self.file.tell()
+        self.blocks = []
+        self.offsets = []
+        self.buffered = 0
+        self.games = 0
+
+    def write_game(self, start, moves, result=None, first='w', meta=None):
+        block = encode_game(start, moves, result, first, meta)
+        self.blocks.append(block)
+        self.offsets.append(OFFSET.pack(self.offset))
+        self.offset += len(block)
+        self.buffered += len(block)
+        self.games += 1
+        if self.buffered >= self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.blocks:
+            self.file.write(b"".join(self.blocks))
+            self.file.flush()
+            self.index.write(b"".join(self.offsets))
+            self.index.flush()
+            self.blocks = []
+            self.offsets = []
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _check_header(path):
+    with open(path, "rb") as f:
+        data = f.read(HEADER.size)
+    if len(data) < HEADER.size or HEADER.unpack(data)[:2] != (MAGIC, VERSION):
+        raise ValueError("Not a game record file: " + path)
+
+
+def _scan_offsets(path, data=None):
+    # Offsets of the game blocks, read from the block headers
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    offsets = []
+    position = HEADER.size
+    while position + GAME.size <= len(data):
+        offsets.append(position)
+        white, black, first, result, count, meta_length = GAME.unpack_from(data, position)
+        position += GAME.size + count * MOVE.size + meta_length
+    if position != len(data):
+        raise ValueError("Truncated game record file: " + path)
+    return offsets
+
+
+def _write_index(path, offsets):
+    with open(path + INDEX_SUFFIX, "wb") as f:
+        f.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+
+
+def _index_valid(path):
+    #---------------------------------------------------------------------------
+    # True if the index exists and its last offset is that of the last game.
+    #---------------------------------------------------------------------------
+    index_path = path + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return False
+    size = os.path.getsize(index_path)
+    if size % OFFSET.size:
+        return False
+    if size == 0:
+        return os.path.getsize(path) == HEADER.size
+    with open(index_path, "rb") as f:
+        f.seek(size - OFFSET.size)
+        last = OFFSET.unpack(f.read(OFFSET.size))[0]
+    with open(path, "rb") as f:
+        f.seek(last)
+        data = f.read(GAME.size)
+    if len(data) < GAME.size:
+        return False
+    white, black, first, result, count, meta_length = GAME.unpack(data)
+    return last + GAME.size + count * MOVE.size + meta_length == os.path.getsize(path)
+
+
+class GameRecordReader:
+#--------------------------------------------------------------------------------
+# Read-only view of a game record file through mmap.  Games are decoded only
+# when they are accessed.
+#--------------------------------------------------------------------------------
+
+    def __init__(self, path):
+        self.path = path
+        _check_header(path)
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if _index_valid(path):
+            with open(path + INDEX_SUFFIX, "rb") as f:
+                self.offsets = array.array("Q", f.read())
+            if sys.byteorder != "little":
+                self.offsets.byteswap()
+        else:
+            self.offsets = _scan_offsets(path, self.data)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        offset = self.offsets[index]
+        white, black, first, result, count, meta_length = GAME.unpack_from(self.data, offset)
+        start = offset + GAME.size
+        end = start + count * MOVE.size
+        moves = array.array("H", self.data[start:end])
+        if sys.byteorder != "little":
+            moves.byteswap()
+        meta = json.loads(self.data[end:end + meta_length].decode()) if meta_length else None
+        return GameRecord(white, black, SIDES[first], RESULTS[result], moves.tolist(), meta)
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield self[index]
+
+    def positions(self):
+        #---------------------------------------------------------------------------
+        # Yield (board, token to move, move code, result of the game) for
+        # every ply of every game (see GameRecord.positions).
+        #---------------------------------------------------------------------------
+        for game in self:
+            for board, token, move in game.positions():
+                yield board, token, move, game.result
+
+
+def read_transcript(path):
+    #---------------------------------------------------------------------------
+    # (player lines, start string, text moves, result) of a transcript
+    # written by Game.play(output=True).
+    #---------------------------------------------------------------------------
+    with open(path) as f:
+        lines = f.read().split("\n")
+    players = [line for line in lines[:3] if line]
+    moves = []
+    start = None
+    final = None
+    for line in lines[3:]:
+        if not line:
+            continue
+        state, _, move = line.partition("\t")
+        if start is None:
+            start = state
+        if move:
+            moves.append(move)
+        else:
+            final = state
+    board = bitboard.BitBoard(start or "")
+    token = 'w'
+    for move in moves:
+        board.make_move(move, token)
+        token = playouts.opponent_of(token)
+    result = playouts.outcome(board)
+    if final is not None and final != board.to_string():
+        raise ValueError("Transcript moves do not lead to its final board: " + path)
+    return players, start, moves, result
+
+
+def write_transcript(path, game):
+    #---------------------------------------------------------------------------
+    # Write game (a GameRecord) in the transcript format of Game.play.
+    #---------------------------------------------------------------------------
+    players = (game.meta or {}).get("players", [])
+    board = game.start_board()
+    token = game.first
+    with open(path, "w") as f:
+        f.write("\n" + "\n".join(players) + "\n")
+        for move in game.moves:
+            f.write(board.to_string() + "\t" + pentago.MOVE_TEXT[move] + "\n")
+            board.make_move(move, token)
+            token = playouts.opponent_of(token)
+        f.write(board.to_string() + "\t\n")
+
+
+def pack_transcripts(record_path, transcript_paths):
+    # Append the transcripts to a record file; returns the number of games
+    with GameRecordWriter(record_path) as writer:
+        for path in transcript_paths:
+            players, start, moves, result = read_transcript(path)
+            writer.write_game(start or "", moves, result, meta={"players": players, "source": os.path.basename(path)})
+    return len(transcript_paths)
+
+
+def unpack_transcripts(record_path, directory):
+    # Write every game of a record file as transcript_<n>.txt in directory
+    os.makedirs(directory, exist_ok=True)
+    with GameRecordReader(record_path) as reader:
+        for index, game in enumerate(reader):
+            write_transcript(os.path.join(directory, "transcript_%d.txt" % index), game)
+        return len(reader)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("pack", "unpack", "info"):
+        print("Usage: python3 records.py pack <record file> <transcript> ...\n"
+              "       python3 records.py unpack <record file> <directory>\n"
+              "       python3 records.py info <record file>")
+        sys.exit(2)
+    command, record_path = sys.argv[1], sys.argv[2]
+    if command == "pack":
+        print("Packed", pack_transcripts(record_path, sys.argv[3:]), "games into", record_path)
+    elif command == "unpack":
+        print("Wrote", unpack_transcripts(record_path, sys.argv[3]), "transcripts to", sys.argv[3])
+    else:
+        with GameRecordReader(record_path) as reader:
+            results = {}
+            plies = 0
+            for game in reader:
+                results[game.result] = results.get(game.result, 0) + 1
+                plies += len(game.moves)
+            print("%d games, %d plies, %d bytes" % (len(reader), plies, os.path.getsize(record_path)))
+            print("white %d, black %d, draws %d, unfinished %d" % (results.get('w', 0), results.get('b', 0),
+                  results.get(playouts.DRAW, 0), results.get(None, 0)))
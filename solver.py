@@ -0,0 +1,207 @@
+# ---------------------------------------------------------------------------
+# Exact endgame solver.
+# Negamax with alpha-beta over the two stone masks (own, opp) of the side to
+# move, using the bitboard move tables directly.  Scores are exact game
+# results with the distance to the end: a win in d plies scores
+# WIN_SCORE - d, a loss in d plies -(WIN_SCORE - d), a draw 0.  Scores are
+# relative to the node, so an entry of the solver's hash table holds for
+# every path to the position.
+#
+# All children are generated first, so an immediate win ends the node at
+# once and other game-ending moves are scored without a search.  The rest
+# are searched in this order: the hash table move, placements that block a
+# five the opponent could complete by placement, then the others.  solve() first runs a null-window search around
+# 0 for the win/draw/loss result and only searches the exact distance when
+# the position is decisive.  A node or time limit makes the result unproven.
+# ---------------------------------------------------------------------------
+import time
+
+import bitboard
+import winlines
+
+WIN_SCORE = 100
+EXACT, LOWER, UPPER = 0, 1, 2
+DEFAULT_ENTRIES = 2**20
+NODE_CHECK_INTERVAL = 1024
+
+MOVE_BIT = bitboard.MOVE_BIT
+MOVE_QMASK = bitboard.MOVE_QMASK
+MOVE_TABLE = bitboard.MOVE_TABLE
+
+
+class SolverTimeout(Exception):
+    # Raised inside a solve when its deadline or node limit is reached
+    pass
+
+
+def _parent_score(score):
+    # Score of a child (for its side to move) seen from the parent, one ply further
+    if score > 0:
+        return 1 - score
+    if score < 0:
+        return -score - 1
+    return 0
+
+
+def distance(score):
+    # Plies to the end of a decisive game, None for a draw
+    return WIN_SCORE - abs(score) if score else None
+
+
+def result_text(score):
+    if score > 0:
+        return "win in %d" % distance(score)
+    if score < 0:
+        return "loss in %d" % distance(score)
+    return "draw"
+
+
+class EndgameSolver:
+
+    def __init__(self, max_entries=DEFAULT_ENTRIES):
+        self.max_entries = max_entries
+        self.table = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.proven = False
+        self.score = None
+        self.move = None
+
+    def clear(self):
+        self.table = {}
+
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def _moves(self, own, opp, tt_move):
+        #---------------------------------------------------------------------------
+        # Move codes for own to move: the table move, placements on the cells
+        # where the opponent would complete a five by placement alone, then
+        # the rest.
+        #---------------------------------------------------------------------------
+        occupied = own | opp
+        blocks = winlines.completing_cells(opp, bitboard.FULL_MASK & ~occupied)
+        first = []
+        rest = []
+        for k in range(bitboard.NUM_CELLS):
+            if occupied >> k & 1:
+                continue
+            codes = range(k * 8, k * 8 + 8)
+            if blocks >> k & 1:
+                first.extend(codes)
+            else:
+                rest.extend(codes)
+        moves = first + rest
+        if tt_move is not None:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    def negamax(self, own, opp, alpha, beta):
+        self.nodes += 1
+        if self.nodes % NODE_CHECK_INTERVAL == 0 and (time.time() >= self.deadline or self.nodes >= self.node_limit):
+            raise SolverTimeout()
+
+        key = (own, opp)
+        alpha_orig, beta_orig = alpha, beta
+        tt_move = None
+        entry = self.table.get(key)
+        if entry is not None:
+            flag, score, tt_move = entry
+            if flag == EXACT:
+                return score, tt_move
+            if flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score, tt_move
+
+        # Generate the children, scoring the ones that end the game; an
+        # immediate win ends the node.
+        best = -WIN_SCORE
+        best_move = None
+        children = []
+        for move in self._moves(own, opp, tt_move):
+            qmask = MOVE_QMASK[move]
+            table = MOVE_TABLE[move]
+            placed = own | MOVE_BIT[move]
+            new_own = (placed & ~qmask) | table[placed & qmask]
+            new_opp = (opp & ~qmask) | table[opp & qmask]
+            own_five = winlines.has_five(new_own)
+            opp_five = winlines.has_five(new_opp)
+            if own_five and not opp_five:
+                self._store(key, EXACT, WIN_SCORE - 1, move)
+                return WIN_SCORE - 1, move
+            if opp_five:
+                # A draw if both have five, else the rotation completed the
+                # opponent's line
+                score = 0 if own_five else 1 - WIN_SCORE
+            elif (new_own | new_opp) == bitboard.FULL_MASK:
+                score = 0
+            else:
+                children.append((move, new_own, new_opp))
+                continue
+            if score > best:
+                best = score
+                best_move = move
+
+        alpha = max(alpha, best)
+        if alpha < beta:
+            for move, new_own, new_opp in children:
+                # The child window is widened by one ply on each side
+                child, _ = self.negamax(new_opp, new_own, -beta - 1, -alpha + 1)
+                score = _parent_score(child)
+                if score > best:
+                    best = score
+                    best_move = move
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta_orig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self._store(key, flag, best, best_move)
+        return best, best_move
+
+    def _store(self, key, flag, score, move):
+        if len(self.table) >= self.max_entries:
+            self.table = {}
+        self.table[key] = (flag, score, move)
+
+    def solve(self, board, token, deadline=float('inf'), node_limit=float('inf'), exact_distance=True):
+        #---------------------------------------------------------------------------
+        # Solve board with token to move.  Returns (score, move, proven); the
+        # score and move are None when the limits stopped the solver before
+        # the result was proven.  With exact_distance=False only win, draw or
+        # loss is proven (the distance is then an upper bound).
+        #---------------------------------------------------------------------------
+        self.reset_stats()
+        self.deadline = deadline
+        self.node_limit = node_limit
+        own = board.mask(token)
+        opp = board.mask('b' if token == 'w' else 'w')
+        start_time = time.time()
+        try:
+            score, move = self.negamax(own, opp, -1, 1)
+            if score != 0 and exact_distance:
+                score, move = self.negamax(own, opp, -WIN_SCORE, WIN_SCORE)
+            self.proven = True
+            self.score = score
+            self.move = move
+        except SolverTimeout:
+            pass
+        self.elapsed = time.time() - start_time
+        return self.score, self.move, self.proven
+
+    def __str__(self):
+        status = ("proven " + result_text(self.score)) if self.proven else "unproven"
+        return "Solver: %s, %d nodes in %.2f s (%.0f nodes/s)" % (status, self.nodes, self.elapsed, self.nps())
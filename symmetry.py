@@ -0,0 +1,199 @@
+import bitboard
+import pentago
+
+# ---------------------------------------------------------------------------
+# The 8 symmetries of the Pentago board (rotations by 90 degrees and
+# reflections of the whole 6x6 grid).  Each one maps blocks onto blocks, so a
+# move maps to a move: the placed cell moves with the board and a block
+# rotation maps to a rotation of the image block, with left and right swapped
+# by the reflections.  Positions are canonicalized to the symmetric variant
+# with the smallest (white, black) masks; a transposition table, cache or
+# book stores results for that representative and maps moves back.
+# ---------------------------------------------------------------------------
+
+N = bitboard.BOARD_SIZE
+NUM_CELLS = bitboard.NUM_CELLS
+NUM_SYMMETRIES = 8
+
+# Cell transforms, as functions of (i, j); index 0 is the identity.
+_TRANSFORMS = [
+    lambda i, j: (i, j),
+    lambda i, j: (j, N-1-i),        # quarter turn clockwise
+    lambda i, j: (N-1-i, N-1-j),    # half turn
+    lambda i, j: (N-1-j, i),        # quarter turn counter-clockwise
+    lambda i, j: (i, N-1-j),        # mirror left/right
+    lambda i, j: (N-1-i, j),        # mirror top/bottom
+    lambda i, j: (j, i),            # transpose
+    lambda i, j: (N-1-j, N-1-i),    # anti-transpose
+]
+
+# CELL_MAP[s][cell] = image of cell under symmetry s
+CELL_MAP = [[bitboard.cell_index(*f(i, j)) for i in range(N) for j in range(N)] for f in _TRANSFORMS]
+
+
+def _compose(a, b):
+    # Cell map of applying a then b
+    return [b[a[k]] for k in range(NUM_CELLS)]
+
+
+INVERSE = [next(t for t in range(NUM_SYMMETRIES) if _compose(CELL_MAP[s], CELL_MAP[t]) == list(range(NUM_CELLS)))
+           for s in range(NUM_SYMMETRIES)]
+
+
+def transform_string(cells, s):
+    #---------------------------------------------------------------------------
+    # Image of a 36-character board string under symmetry s.
+    #---------------------------------------------------------------------------
+    out = ['.'] * NUM_CELLS
+    cell_map = CELL_MAP[s]
+    for k, cell in enumerate(cells):
+        out[cell_map[k]] = cell
+    return "".join(out)
+
+
+def _build_mask_tables():
+    #---------------------------------------------------------------------------
+    # ROW_TABLES[s][row][bits]: image under s of the 6-bit pattern bits in row,
+    # so a 36-bit mask is transformed with one lookup per row.
+    #---------------------------------------------------------------------------
+    tables = []
+    for s in range(NUM_SYMMETRIES):
+        rows = []
+        for row in range(N):
+            table = []
+            for pattern in range(1 << N):
+                image = 0
+                for col in range(N):
+                    if pattern >> col & 1:
+                        image |= 1 << CELL_MAP[s][row*N + col]
+                table.append(image)
+            rows.append(table)
+        tables.append(rows)
+    return tables
+
+
+ROW_TABLES = _build_mask_tables()
+_ROW_MASK = (1 << N) - 1
+
+
+def transform_mask(bits, s):
+    t0, t1, t2, t3, t4, t5 = ROW_TABLES[s]
+    return (t0[bits & _ROW_MASK] | t1[bits >> 6 & _ROW_MASK] | t2[bits >> 12 & _ROW_MASK]
+            | t3[bits >> 18 & _ROW_MASK] | t4[bits >> 24 & _ROW_MASK] | t5[bits >> 30 & _ROW_MASK])
+
+
+def _build_move_map():
+    #---------------------------------------------------------------------------
+    # MOVE_MAP[s][code]: move code whose effect on the image board matches the
+    # effect of code on the original board.  The rotation image is found by
+    # comparing the rotated images of a board with all cells distinct.
+    #---------------------------------------------------------------------------
+    labels = list(range(NUM_CELLS))
+
+    def rotated(cells, rotBlock, clockwise):
+        out = list(cells)
+        rowOffset = ((rotBlock-1)//2)*3
+        colOffset = ((rotBlock-1)%2)*3
+        for r in range(3):
+            for c in range(3):
+                if clockwise:
+                    i, j = rowOffset+c, colOffset+2-r
+                else:
+                    i, j = rowOffset+2-c, colOffset+r
+                out[i*N + j] = cells[(rowOffset+r)*N + colOffset+c]
+        return out
+
+    def image(cells, s):
+        out = [None] * NUM_CELLS
+        for k, v in enumerate(cells):
+            out[CELL_MAP[s][k]] = v
+        return out
+
+    moves = []
+    for s in range(NUM_SYMMETRIES):
+        rotation_map = []
+        for rotation in range(pentago.NUM_ROTATIONS):
+            rotBlock, clockwise = rotation // 2 + 1, rotation % 2 == 1
+            target = image(rotated(labels, rotBlock, clockwise), s)
+            base = image(labels, s)
+            rotation_map.append(next(r for r in range(pentago.NUM_ROTATIONS)
+                                     if rotated(base, r // 2 + 1, r % 2 == 1) == target))
+        moves.append([CELL_MAP[s][code // pentago.NUM_ROTATIONS] * pentago.NUM_ROTATIONS
+                      + rotation_map[code % pentago.NUM_ROTATIONS]
+                      for code in range(pentago.NUM_MOVES)])
+    return moves
+
+
+MOVE_MAP = _build_move_map()
+
+
+def transform_move(move, s):
+    #---------------------------------------------------------------------------
+    # Image of a move (code or text) under symmetry s, in the same form.
+    #---------------------------------------------------------------------------
+    if move.__class__ is int:
+        return MOVE_MAP[s][move]
+    return pentago.MOVE_TEXT[MOVE_MAP[s][pentago.MOVE_CODE[move]]]
+
+
+def canonical_masks(white, black):
+    #---------------------------------------------------------------------------
+    # Returns (white', black', s): the symmetric variant with the smallest
+    # (white, black) pair and the symmetry s that maps the position onto it.
+    #---------------------------------------------------------------------------
+    best = (white, black)
+    best_s = 0
+    for s in range(1, NUM_SYMMETRIES):
+        candidate = (transform_mask(white, s), transform_mask(black, s))
+        if candidate < best:
+            best = candidate
+            best_s = s
+    return best[0], best[1], best_s
+
+
+def canonical(board):
+    #---------------------------------------------------------------------------
+    # canonical_masks for any board providing mask(token).
+    #---------------------------------------------------------------------------
+    return canonical_masks(board.mask('w'), board.mask('b'))
+
+
+def hash_masks(white, black):
+    # Zobrist key of a position given as masks (same key as the boards keep)
+    h = 0
+    for q in range(1, 5):
+        qmask = bitboard.QUADRANT_MASK[q]
+        h ^= bitboard.BLOCK_HASH['w'][q][white & qmask] ^ bitboard.BLOCK_HASH['b'][q][black & qmask]
+    return h
+
+
+def canonical_key(board):
+    #---------------------------------------------------------------------------
+    # (Zobrist key of the canonical representative, symmetry to reach it).
+    # Moves found for the representative are mapped back with
+    # transform_move(move, INVERSE[s]).
+    #---------------------------------------------------------------------------
+    white, black, s = canonical(board)
+    return hash_masks(white, black), s
+
+
+def to_canonical(board):
+    #---------------------------------------------------------------------------
+    # Canonical representative as a BitBoard, and the symmetry used.
+    #---------------------------------------------------------------------------
+    white, black, s = canonical(board)
+    return bitboard.BitBoard.from_masks(white, black), s
+
+
+def from_canonical(board, s):
+    #---------------------------------------------------------------------------
+    # Undo to_canonical: the original position as a BitBoard.
+    #---------------------------------------------------------------------------
+    inverse = INVERSE[s]
+    return bitboard.BitBoard.from_masks(transform_mask(board.mask('w'), inverse),
+                                        transform_mask(board.mask('b'), inverse))
+
+
+def map_move(move, s):
+    # transform_move for move codes that may be None (no move)
+    return None if move is None else MOVE_MAP[s][move]
@@ -0,0 +1,265 @@
+import json
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+# Search telemetry.
+# Telemetry(sink).attach(agent) instruments one agent: its search, win,
+# evaluate and move generation methods are wrapped on that instance only,
+# and after every get_move one record (a dict, see SearchStats.record) is
+# passed to the sink.  Agents that are not attached run the plain methods,
+# so telemetry costs nothing when it is not used.
+#
+# Counts are made in this process; nodes searched by worker processes
+# (-w) only show in the total the agent itself reports.  The UCT agent
+# (Mcts) has no recursive search to wrap; its record takes the tree
+# iterations (nodes) and playouts it counts itself.
+#
+# Sinks have emit(record) and close(): StreamSink (JSON lines, e.g. to
+# stdout), FileSink (JSON lines appended to a file) and MemorySink (keeps
+# the records in a list).
+# ---------------------------------------------------------------------------
+
+# Recursive search methods; the nesting depth of their calls is the ply
+SEARCH_METHODS = ("minimax", "alphabeta", "pvs")
+# Search methods that only forward to another one (Pvs.alphabeta calls
+# pvs); they are not counted when the agent has the method they forward to
+FORWARDING_METHODS = {"alphabeta": "pvs"}
+# Counts an agent keeps for its last move only, recorded as they are
+MOVE_COUNTERS = ("solver_nodes", "threat_nodes", "researches", "aspiration_fails")
+
+
+class StreamSink:
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def emit(self, record):
+        self.stream.write(json.dumps(record, sort_keys=True) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class FileSink(StreamSink):
+
+    def __init__(self, path):
+        super().__init__(open(path, "a"))
+        self.path = path
+
+    def close(self):
+        self.stream.close()
+
+
+class MemorySink:
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+def open_sink(spec):
+    # Sink for a command line argument: "-" is stdout, anything else a file
+    if spec == "-":
+        return StreamSink()
+    return FileSink(spec)
+
+
+class SearchStats:
+#--------------------------------------------------------------------------------
+# Counters of one get_move.  nodes_per_ply[p] counts the search calls at
+# ply p, over all iterations of an iterative deepening search.  Cutoffs,
+# cache and table hits are read from the agent's own counters (move orderer,
+# evaluation cache, transposition table) as differences between the start
+# and the end of the move.
+#--------------------------------------------------------------------------------
+
+    def __init__(self):
+        self.start(None)
+
+    def start(self, agent):
+        self.start_time = time.perf_counter()
+        self.nodes_per_ply = []
+        self.ply = 0
+        self.leaf_evals = 0
+        self.win_checks = 0
+        self.move_generations = 0
+        self.playouts = 0
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+        self.counters = _agent_counters(agent) if agent is not None else {}
+
+    def record(self, agent, board, move):
+        #---------------------------------------------------------------------------
+        # The telemetry record of the move just made by agent from board.
+        #---------------------------------------------------------------------------
+        elapsed = time.perf_counter() - self.start_time
+        counters = _agent_counters(agent)
+        record = {
+            "agent": agent.__class__.__name__,
+            "player": agent.player_number,
+            "token": agent.token,
+            "move": move,
+            "empty_cells": board.empty_cells if hasattr(board, "empty_cells") else None,
+            "time": elapsed,
+            "eval_time": self.eval_time,
+            "movegen_time": self.movegen_time,
+            "other_time": elapsed - self.eval_time - self.movegen_time,
+            "nodes": getattr(agent, "nodes", sum(self.nodes_per_ply)),
+            "nodes_per_ply": self.nodes_per_ply,
+            "depth": getattr(agent, "completed_depth", len(self.nodes_per_ply) - 1),
+            "leaf_evals": self.leaf_evals,
+            "win_checks": self.win_checks,
+            "move_generations": self.move_generations,
+            "playouts": getattr(agent, "playouts", self.playouts),
+        }
+        for name, value in counters.items():
+            record[name] = value - self.counters.get(name, 0)
+        for name in MOVE_COUNTERS:
+            if hasattr(agent, name):
+                record[name] = getattr(agent, name)
+        return record
+
+
+def _agent_counters(agent):
+    # Running totals kept by the agent's own components
+    counters = {}
+    orderer = getattr(agent, "orderer", None)
+    if orderer is not None:
+        counters["cutoffs"] = orderer.cutoffs
+        counters["first_move_cutoffs"] = orderer.first_move_cutoffs
+    cache = getattr(agent, "eval_cache", None)
+    if cache is not None:
+        counters["eval_cache_lookups"] = cache.lookups
+        counters["eval_cache_hits"] = cache.hits
+    tt = getattr(agent, "tt", None)
+    if tt is not None:
+        counters["tt_probes"] = tt.probes
+        counters["tt_hits"] = tt.hits
+    return counters
+
+
+class Telemetry:
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def attach(self, agent):
+        #---------------------------------------------------------------------------
+        # Instrument agent (and the minimax agent Minimax_mcts searches with);
+        # returns its SearchStats.
+        #---------------------------------------------------------------------------
+        stats = SearchStats()
+        _instrument(agent, stats)
+        helper = getattr(agent, "minimax_agent", None)
+        if helper is not None:
+            _instrument(helper, stats)
+        get_move = agent.get_move
+
+        def traced_get_move(board):
+            stats.start(agent)
+            move = get_move(board)
+            self.sink.emit(stats.record(agent, board, move))
+            return move
+
+        agent.get_move = traced_get_move
+        return stats
+
+    def detach(self, agent):
+        # Restore the plain methods of agent
+        for target in (agent, getattr(agent, "minimax_agent", None)):
+            if target is None:
+                continue
+            for name in SEARCH_METHODS + ("win", "evaluate", "child_moves", "playout_tasks", "get_move"):
+                target.__dict__.pop(name, None)
+            orderer = getattr(target, "orderer", None)
+            if orderer is not None:
+                orderer.__dict__.pop("order", None)
+
+    def close(self):
+        self.sink.close()
+
+
+def _instrument(agent, stats):
+    #---------------------------------------------------------------------------
+    # Replace the methods of agent that telemetry counts by counting
+    # wrappers, set as instance attributes so the searches' own recursive
+    # calls go through them.
+    #---------------------------------------------------------------------------
+    clock = time.perf_counter
+
+    for name in SEARCH_METHODS:
+        search = getattr(agent, name, None)
+        if search is None or hasattr(agent, FORWARDING_METHODS.get(name, "")):
+            continue
+
+        def traced_search(*args, search=search):
+            ply = stats.ply
+            if ply == len(stats.nodes_per_ply):
+                stats.nodes_per_ply.append(0)
+            stats.nodes_per_ply[ply] += 1
+            stats.ply = ply + 1
+            try:
+                return search(*args)
+            finally:
+                stats.ply = ply
+
+        setattr(agent, name, traced_search)
+
+    win = agent.win
+
+    def traced_win(board):
+        stats.win_checks += 1
+        return win(board)
+
+    evaluate = agent.evaluate
+
+    def traced_evaluate(*args):
+        stats.leaf_evals += 1
+        start = clock()
+        try:
+            return evaluate(*args)
+        finally:
+            stats.eval_time += clock() - start
+
+    child_moves = agent.child_moves
+
+    def traced_child_moves(board, token):
+        stats.move_generations += 1
+        start = clock()
+        moves = child_moves(board, token)
+        stats.movegen_time += clock() - start
+        return moves
+
+    agent.win = traced_win
+    agent.evaluate = traced_evaluate
+    agent.child_moves = traced_child_moves
+
+    orderer = getattr(agent, "orderer", None)
+    if orderer is not None:
+        # Ordering counts as move generation
+        order = orderer.order
+
+        def traced_order(*args):
+            start = clock()
+            moves = order(*args)
+            stats.movegen_time += clock() - start
+            return moves
+
+        orderer.order = traced_order
+
+    playout_tasks = getattr(agent, "playout_tasks", None)
+    if playout_tasks is not None:
+
+        def traced_playout_tasks(board, moves):
+            tasks = playout_tasks(board, moves)
+            stats.playouts += sum(count for index, count, seed in tasks)
+            return tasks
+
+        agent.playout_tasks = traced_playout_tasks
@@ -0,0 +1,87 @@
+# ---------------------------------------------------------------------------
+# Differential test of evaluation.py: random positions are scored by
+# evaluation.evaluate() on both board types and by Player.sg3824_h, and
+# compared with reference_sg3824_h, the original string-based heuristic.
+# Run with "python -m pytest tests" from the top directory.
+# ---------------------------------------------------------------------------
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agents
+import bitboard
+import evaluation
+import pentago
+
+NUM_POSITIONS = 200
+SEED = 0
+
+
+def reference_sg3824_h(board, token):
+    #---------------------------------------------------------------------------
+    # The original sg3824 heuristic on a PentagoBoard.  It shares no code or
+    # tables with what it checks: the lines are read from board.board, and
+    # the patterns are scored by this copy of the original score_line.
+    #---------------------------------------------------------------------------
+    def score_line(line):
+        patterns = {'5': 10000, '4': 1000, '3': 100, '2': 10, '1': 1}
+        score = 0
+        consecutive_count = 0
+        for element in line:
+            if element == token:
+                consecutive_count += 1
+            elif element != '.':
+                consecutive_count = 0
+            score += patterns.get(str(consecutive_count), 0)
+            if element != token:
+                consecutive_count = 0
+        return score
+
+    def line_scoring(board):
+        score = 0
+        for i in range(board.BOARD_SIZE):
+            score += score_line(board.board[i])
+            score += score_line([board.board[j][i] for j in range(board.BOARD_SIZE)])
+        for diag in board.get_diagonals():
+            score += score_line(diag)
+        return score
+
+    twist = 0
+    for gameBlock in range(1, 5):
+        twist = max(twist, line_scoring(board.rotate_left(gameBlock)), line_scoring(board.rotate_right(gameBlock)))
+    mobility = sum(line_scoring(board.apply_move(move, token)) for move in board.get_moves())
+    return line_scoring(board) + twist + mobility
+
+
+def random_positions(num_positions=NUM_POSITIONS, seed=SEED):
+    # PentagoBoards after a random number of random moves from the empty board
+    rng = random.Random(seed)
+    for _ in range(num_positions):
+        board = pentago.PentagoBoard()
+        token = 'w'
+        for _ in range(rng.randrange(evaluation.NUM_CELLS)):
+            board = board.apply_move(rng.choice(board.get_moves()), token)
+            token = 'b' if token == 'w' else 'w'
+        yield board
+
+
+def test_evaluate_matches_reference():
+    for board in random_positions():
+        bits = bitboard.BitBoard(board.to_string())
+        for token in evaluation.TOKENS:
+            expected = reference_sg3824_h(board, token)
+            assert evaluation.evaluate(board, token) == expected, board.to_string()
+            assert evaluation.evaluate(bits, token) == expected, board.to_string()
+
+
+def test_player_sg3824_h_matches_reference():
+    player = agents.Player("Reference", 'w', 1, 1)
+    for board in random_positions(NUM_POSITIONS // 4, SEED + 1):
+        bits = bitboard.BitBoard(board.to_string())
+        for token in evaluation.TOKENS:
+            expected = reference_sg3824_h(board, token)
+            assert player.sg3824_h(board, token) == expected, board.to_string()
+            assert player.sg3824_h(bits, token) == expected, board.to_string()
+
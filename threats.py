@@ -0,0 +1,284 @@
+# ---------------------------------------------------------------------------
+# Threat detection and forcing-sequence search.
+# Positions are the stone masks of the side to move (own) and of the
+# opponent (opp).  With the line masks of winlines.py:
+#   immediate_wins     moves that make a five for own (and not for opp)
+#   must_answer        the opponent's winning moves, which own has to stop
+#   open_fours         cells completing a five by placement alone
+#   rotation_threats   winning moves that need their rotation
+#   safe_moves         moves after which the opponent cannot win at once,
+#                      found per rotation with masks (safe_cells)
+#   restrict_moves     the move list a search needs: the wins if there are
+#                      any, else the safe answers to a threat
+# ThreatSearch looks for a forced win: own only plays moves that threaten
+# to win next move, the opponent every move that parries all threats, and
+# own wins if a threat cannot be parried.  It is a narrow search, so it
+# sees forced wins far deeper than a full-width search in the same time.
+# ---------------------------------------------------------------------------
+import time
+
+import bitboard
+import winlines
+
+DEFAULT_DEPTH = 3
+
+MOVE_BIT = bitboard.MOVE_BIT
+MOVE_QMASK = bitboard.MOVE_QMASK
+MOVE_TABLE = bitboard.MOVE_TABLE
+
+
+def child(own, opp, move):
+    # (own, opp) after own plays move
+    qmask = MOVE_QMASK[move]
+    table = MOVE_TABLE[move]
+    placed = own | MOVE_BIT[move]
+    return (placed & ~qmask) | table[placed & qmask], (opp & ~qmask) | table[opp & qmask]
+
+
+def immediate_wins(own, opp):
+    return winlines.winning_moves(own, opp)
+
+
+def has_winning_move(own, opp):
+    #---------------------------------------------------------------------------
+    # True if own has an immediate win: winlines.winning_moves stopping at
+    # the first rotation that gives one.
+    #---------------------------------------------------------------------------
+    if bin(own).count("1") < winlines.WIN_LENGTH - 1:
+        return False
+    for gameBlock in range(1, 5):
+        qmask = bitboard.QUADRANT_MASK[gameBlock]
+        ownBits = own & qmask
+        oppBits = opp & qmask
+        for table in (bitboard.ROTATE_LEFT[gameBlock], bitboard.ROTATE_RIGHT[gameBlock]):
+            own_r = (own & ~qmask) | table[ownBits]
+            opp_r = (opp & ~qmask) | table[oppBits]
+            if winlines.has_five(opp_r):
+                continue
+            empty_r = bitboard.FULL_MASK & ~(own_r | opp_r)
+            if winlines.has_five(own_r):
+                if empty_r:
+                    return True
+            elif winlines.completing_cells(own_r, empty_r):
+                return True
+    return False
+
+
+def must_answer(own, opp):
+    # The opponent's winning moves if own passed; own must parry all of them
+    return winlines.winning_moves(opp, own)
+
+
+def open_fours(own, opp):
+    # Bitmask of the empty cells on which a stone of own completes a five
+    # without any rotation
+    return winlines.completing_cells(own, bitboard.FULL_MASK & ~(own | opp))
+
+
+def rotation_threats(own, opp):
+    #---------------------------------------------------------------------------
+    # Winning moves of own whose placement alone does not make a five: the
+    # five only appears after the rotation.
+    #---------------------------------------------------------------------------
+    fours = open_fours(own, opp)
+    if winlines.has_five(own):
+        return []
+    return [move for move in winlines.winning_moves(own, opp) if not fours >> (move >> 3) & 1]
+
+
+def _rotate(bits, rotation):
+    # bits after the block rotation of move code rotation (0..7)
+    qmask = MOVE_QMASK[rotation]
+    return (bits & ~qmask) | MOVE_TABLE[rotation][bits & qmask]
+
+
+def _unrotate(bits, rotation):
+    # Inverse of _rotate: the other direction of the same block
+    return _rotate(bits, rotation ^ 1)
+
+
+def safe_cells(own, opp, rotation):
+    #---------------------------------------------------------------------------
+    # Bitmask of the cells on which own can place before the rotation
+    # (0..7) and leave the opponent without an immediate win.  After the
+    # rotation opp is fixed whatever the cell, and one more stone of own can
+    # only remove wins: the opponent's win with a later rotation r survives
+    # unless own then has a five (the cells completing one) or the new
+    # stone takes the last cell the win can be placed on.  So the safe cells
+    # are found with masks, without playing each move (see safe_moves).
+    #---------------------------------------------------------------------------
+    own_r = _rotate(own, rotation)
+    opp_r = _rotate(opp, rotation)
+    empty_r = bitboard.FULL_MASK & ~(own_r | opp_r)
+    if winlines.has_five(opp_r):
+        # Only a five of own as well (a draw) makes it safe
+        if winlines.has_five(own_r):
+            safe = empty_r
+        else:
+            safe = winlines.completing_cells(own_r, empty_r)
+        return _unrotate(safe, rotation)
+    safe = empty_r
+    for r in range(8):
+        own_2 = _rotate(own_r, r)
+        if winlines.has_five(own_2):
+            continue    # the opponent cannot win with this rotation
+        opp_2 = _rotate(opp_r, r)
+        empty_2 = bitboard.FULL_MASK & ~(own_2 | opp_2)
+        if winlines.has_five(opp_2):
+            targets = empty_2
+        else:
+            targets = winlines.completing_cells(opp_2, empty_2)
+        if not targets:
+            continue
+        # Stones of own that stop every win with this rotation
+        kill = winlines.completing_cells(own_2, empty_2)
+        if not targets & (targets - 1):
+            kill |= targets
+        safe &= _unrotate(kill, r)
+        if not safe:
+            break
+    return _unrotate(safe, rotation)
+
+
+def safe_moves(own, opp, moves):
+    #---------------------------------------------------------------------------
+    # The moves of own after which the opponent neither has a five (unless
+    # own has one as well, a draw) nor an immediate win.
+    #---------------------------------------------------------------------------
+    cells = [None] * 8
+    safe = []
+    for move in moves:
+        rotation = move & 7
+        if cells[rotation] is None:
+            cells[rotation] = safe_cells(own, opp, rotation)
+        if cells[rotation] >> (move >> 3) & 1:
+            safe.append(move)
+    return safe
+
+
+def restrict_moves(own, opp, moves):
+    #---------------------------------------------------------------------------
+    # The part of moves (codes for own to move) a search has to look at: the
+    # winning moves if own has any, else, if the opponent threatens to win,
+    # the moves that parry every threat.  If nothing parries, the position
+    # is lost and moves is returned unchanged.
+    #---------------------------------------------------------------------------
+    wins = winlines.winning_moves(own, opp)
+    if wins:
+        wins = set(wins)
+        forced = [move for move in moves if move in wins]
+        if forced:
+            return forced
+    if not has_winning_move(opp, own):
+        return moves
+    return safe_moves(own, opp, moves) or moves
+
+
+class ThreatTimeout(Exception):
+    # Raised inside a search when its deadline or node limit is reached
+    pass
+
+
+class ThreatSearch:
+#--------------------------------------------------------------------------------
+# Forcing-sequence search.  find_win(own, opp, depth) returns a move that
+# wins by force within depth moves of own, every one but the last a threat,
+# or None.  Results are kept in a table for the whole search.
+#--------------------------------------------------------------------------------
+
+    def __init__(self):
+        self.table = {}
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.move = None
+        self.proven = False
+
+    def find_win(self, own, opp, depth=DEFAULT_DEPTH, deadline=float('inf'), node_limit=float('inf')):
+        #---------------------------------------------------------------------------
+        # The first move of a forced win for own, or None if there is none
+        # within depth moves (or the limits stopped the search first; then
+        # proven is False).
+        #---------------------------------------------------------------------------
+        self.table = {}
+        self.nodes = 0
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.move = None
+        self.proven = False
+        start_time = time.time()
+        try:
+            self.move = self._attack(own, opp, depth)
+            self.proven = True
+        except ThreatTimeout:
+            pass
+        self.elapsed = time.time() - start_time
+        return self.move
+
+    def _count(self):
+        # A node of this search costs as much as hundreds of alpha-beta
+        # nodes, so the limits are checked at every one
+        self.nodes += 1
+        if self.nodes >= self.node_limit or time.time() >= self.deadline:
+            raise ThreatTimeout()
+
+    def _attack(self, own, opp, depth):
+        # Winning move for own (to move) within depth moves, or None
+        self._count()
+        wins = winlines.winning_moves(own, opp)
+        if wins:
+            return wins[0]
+        if depth <= 1 or (own | opp) == bitboard.FULL_MASK:
+            return None
+        key = (own, opp, depth)
+        if key in self.table:
+            return self.table[key]
+        result = None
+        for move in bitboard.distinct_moves(own, opp, 'w'):
+            new_own, new_opp = child(own, opp, move)
+            if winlines.has_five(new_opp) or (new_own | new_opp) == bitboard.FULL_MASK:
+                continue
+            # Only threats, and only if the opponent cannot win first
+            if not has_winning_move(new_own, new_opp) or has_winning_move(new_opp, new_own):
+                continue
+            if self._defended(new_opp, new_own, depth - 1):
+                continue
+            result = move
+            break
+        self.table[key] = result
+        return result
+
+    def _defended(self, own, opp, depth):
+        #---------------------------------------------------------------------------
+        # True if own (the defender, to move and without an immediate win)
+        # has a move that parries every threat of opp and after which opp
+        # has no forced win within depth moves.
+        #---------------------------------------------------------------------------
+        self._count()
+        moves = bitboard.distinct_moves(own, opp, 'w')
+        # Placements on the attacker's winning cells first: they are the
+        # likely answers
+        cells = winlines.threat_cells(opp, own)
+        moves.sort(key=lambda move: not cells >> (move >> 3) & 1)
+        for move in moves:
+            new_own, new_opp = child(own, opp, move)
+            if winlines.has_five(new_opp):
+                if winlines.has_five(new_own):
+                    return True     # a draw: the attack fails
+                continue
+            if has_winning_move(new_opp, new_own):
+                continue
+            if self._attack(new_opp, new_own, depth) is None:
+                return True
+        return False
+
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        if not self.proven:
+            status = "unproven"
+        elif self.move is None:
+            status = "no forced win"
+        else:
+            status = "forced win"
+        return "Threats: %s, %d nodes in %.2f s" % (status, self.nodes, self.elapsed)
@@ -0,0 +1,151 @@
+# ---------------------------------------------------------------------------
+# Transposition table for the search agents.
+# Entries are addressed by a 64-bit Zobrist key (see zobrist.py) and hold the
+# search depth, the bound type of the score, the score and the best move.
+# The table has a fixed number of slots derived from a memory cap, and one of
+# two replacement policies:
+#   "depth"    - one slot per index; an entry is only replaced by a search at
+#                least as deep, or by any entry once it is from an old search
+#   "two-tier" - two slots per index: a depth-preferred slot as above and an
+#                always-replace slot that takes whatever the first one refused
+# ---------------------------------------------------------------------------
+
+EXACT = 0
+LOWER = 1  # score is a lower bound (fail high)
+UPPER = 2  # score is an upper bound (fail low)
+
+# Rough size of one entry in CPython: a slot in each of the parallel lists
+# plus the key, score and move objects they reference.
+ENTRY_BYTES = 128
+DEFAULT_BYTES = 16 * 2**20
+
+POLICIES = ("depth", "two-tier")
+
+
+class TranspositionTable:
+
+    def __init__(self, max_bytes=DEFAULT_BYTES, policy="depth"):
+        if policy not in POLICIES:
+            raise ValueError("Unknown replacement policy: " + str(policy))
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.slots = max(1, max_bytes // ENTRY_BYTES)
+        if policy == "two-tier":
+            self.buckets = max(1, self.slots // 2)
+            self.slots = self.buckets * 2
+        else:
+            self.buckets = self.slots
+        self.clear()
+
+    def clear(self):
+        n = self.slots
+        self.keys = [None] * n
+        self.depths = [0] * n
+        self.flags = [EXACT] * n
+        self.scores = [0] * n
+        self.moves = [None] * n
+        self.ages = [0] * n
+        self.generation = 0
+        self.used = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0   # probed slot held a different position
+        self.stores = 0
+        self.overwrites = 0   # a store evicted a different position
+        self.rejected = 0     # a store was refused by the replacement policy
+
+    def new_search(self):
+        # Entries from earlier searches become preferred victims for replacement.
+        self.generation += 1
+
+    def _slot_of(self, key):
+        #---------------------------------------------------------------------------
+        # Slot holding key, or None.  Counts collisions on the way.
+        #---------------------------------------------------------------------------
+        keys = self.keys
+        if self.policy == "two-tier":
+            first = (key % self.buckets) * 2
+            if keys[first] == key:
+                return first
+            if keys[first + 1] == key:
+                return first + 1
+            if keys[first] is not None or keys[first + 1] is not None:
+                self.collisions += 1
+            return None
+        index = key % self.buckets
+        stored = keys[index]
+        if stored == key:
+            return index
+        if stored is not None:
+            self.collisions += 1
+        return None
+
+    def probe(self, key):
+        #---------------------------------------------------------------------------
+        # Returns (depth, flag, score, move) for key, or None.
+        #---------------------------------------------------------------------------
+        self.probes += 1
+        slot = self._slot_of(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.depths[slot], self.flags[slot], self.scores[slot], self.moves[slot]
+
+    def _write(self, slot, key, depth, flag, score, move):
+        keys = self.keys
+        if keys[slot] is None:
+            self.used += 1
+        elif keys[slot] != key:
+            self.overwrites += 1
+        keys[slot] = key
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.scores[slot] = score
+        self.moves[slot] = move
+        self.ages[slot] = self.generation
+        self.stores += 1
+
+    def _prefers(self, slot, key, depth):
+        # Depth-preferred test: empty, same position, stale, or not deeper.
+        return (self.keys[slot] is None or self.keys[slot] == key
+                or self.ages[slot] != self.generation or depth >= self.depths[slot])
+
+    def store(self, key, depth, flag, score, move):
+        if self.policy == "two-tier":
+            first = (key % self.buckets) * 2
+            if self._prefers(first, key, depth):
+                self._write(first, key, depth, flag, score, move)
+            else:
+                self._write(first + 1, key, depth, flag, score, move)
+            return
+        index = key % self.buckets
+        if self._prefers(index, key, depth):
+            self._write(index, key, depth, flag, score, move)
+        else:
+            self.rejected += 1
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "used": self.used,
+            "probes": self.probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "rejected": self.rejected,
+        }
+
+    def __str__(self):
+        s = self.stats()
+        return ("TT: %d/%d slots used, %d probes, %d hits (%.1f%%), %d misses, "
+                "%d collisions, %d overwrites, %d rejected"
+                % (s["used"], s["slots"], s["probes"], s["hits"], 100*s["hit_rate"],
+                   s["misses"], s["collisions"], s["overwrites"], s["rejected"]))
@@ -0,0 +1,256 @@
+import math
+import random
+import time
+
+import bitboard
+import pentago
+import playouts
+import winlines
+
+# ---------------------------------------------------------------------------
+# UCT Monte Carlo tree search.
+# The tree is stored in parallel lists indexed by node number, and the
+# children of a node occupy one contiguous block, so a node is a handful of
+# list slots rather than an object.  Each iteration selects a path with UCB1
+# (or PUCT with uniform priors), expands the leaf, finishes the game with a
+# random playout (playouts.py) and backs the result up the path.  After a move the subtree
+# under the position actually reached is kept and compacted into a new tree.
+# ---------------------------------------------------------------------------
+
+DRAW = playouts.DRAW
+EXPLORATION = 1.4
+POLICIES = ("ucb1", "puct")
+
+
+opponent_of = playouts.opponent_of
+
+
+class UctTree:
+
+    def __init__(self, board, to_move, exploration=EXPLORATION, policy="ucb1", rng=None, leaf_playouts=1):
+        if policy not in POLICIES:
+            raise ValueError("Unknown selection policy: " + str(policy))
+        self.board = bitboard.BitBoard.from_masks(board.mask('w'), board.mask('b'))
+        self.to_move = to_move
+        self.exploration = exploration
+        self.policy = policy
+        self.rng = rng if rng is not None else random.Random()
+        # More than one playout per leaf runs them as one batch (playouts.py)
+        self.leaf_playouts = leaf_playouts
+        self._clear()
+        self._new_node(-1, -1, playouts.outcome(self.board))
+
+    def _clear(self):
+        self.parent = []
+        self.move = []
+        self.first_child = []    # -1 until expanded
+        self.num_children = []
+        self.visits = []
+        self.wins = []           # for the player who made the move into the node
+        self.result = []         # outcome for terminal nodes, else None
+
+    def _new_node(self, parent, move, result):
+        self.parent.append(parent)
+        self.move.append(move)
+        self.first_child.append(-1)
+        self.num_children.append(0)
+        self.visits.append(0)
+        self.wins.append(0.0)
+        self.result.append(result)
+        return len(self.parent) - 1
+
+    def __len__(self):
+        return len(self.parent)
+
+    def _expand(self, node, token):
+        #---------------------------------------------------------------------------
+        # Create one child per distinct position token can reach from node
+        # (bitboard.distinct_moves).  If token has an immediate win, only the
+        # winning moves are added.
+        #---------------------------------------------------------------------------
+        board = self.board
+        moves = winlines.winning_moves(board.mask(token), board.mask(opponent_of(token)))
+        if not moves:
+            moves = bitboard.distinct_moves(board.white, board.black, token)
+        self.first_child[node] = len(self.parent)
+        self.num_children[node] = len(moves)
+        for move in moves:
+            undo = board.make_move(move, token)
+            self._new_node(node, move, playouts.outcome(board))
+            board.unmake_move(undo)
+
+    def _select_child(self, node):
+        first = self.first_child[node]
+        end = first + self.num_children[node]
+        visits = self.visits
+        wins = self.wins
+        parent_visits = visits[node]
+        best = first
+        best_score = float('-inf')
+        if self.policy == "ucb1":
+            log_n = math.log(parent_visits) if parent_visits > 0 else 0.0
+            for child in range(first, end):
+                n = visits[child]
+                if n == 0:
+                    return child
+                score = wins[child] / n + self.exploration * math.sqrt(log_n / n)
+                if score > best_score:
+                    best_score = score
+                    best = child
+        else:
+            # Uniform priors; an unvisited child is valued at the average of
+            # its visited siblings (the parent's value for the side to move)
+            u = self.exploration * math.sqrt(parent_visits) / (end - first)
+            first_play = 1.0 - wins[node] / parent_visits if parent_visits else 0.5
+            for child in range(first, end):
+                n = visits[child]
+                score = (wins[child] / n if n else first_play) + u / (1 + n)
+                if score > best_score:
+                    best_score = score
+                    best = child
+        return best
+
+    def iterate(self):
+        #---------------------------------------------------------------------------
+        # One selection / expansion / playout / backpropagation step.
+        #---------------------------------------------------------------------------
+        board = self.board
+        node = 0
+        token = self.to_move
+        undo_stack = []
+        while self.result[node] is None and self.first_child[node] >= 0:
+            node = self._select_child(node)
+            undo_stack.append(board.make_move(self.move[node], token))
+            token = opponent_of(token)
+
+        result = self.result[node]
+        if result is None and self.visits[node] > 0:
+            self._expand(node, token)
+            node = self._select_child(node)
+            undo_stack.append(board.make_move(self.move[node], token))
+            token = opponent_of(token)
+            result = self.result[node]
+
+        # Playout results as (games, wins, draws) for the player who moved
+        # into node; token is the player to move at node.
+        mover = opponent_of(token)
+        if result is not None:
+            games, wins, draws = 1, int(result == mover), int(result == DRAW)
+        elif self.leaf_playouts > 1:
+            (wins, draws, losses), = playouts.playout_counts([board], token, self.leaf_playouts, mover,
+                                                             seed=self.rng.getrandbits(32))
+            games = wins + draws + losses
+        else:
+            result = playouts.random_playout(board, token, self.rng)
+            games, wins, draws = 1, int(result == mover), int(result == DRAW)
+
+        while undo_stack:
+            board.unmake_move(undo_stack.pop())
+
+        # Players alternate up the path, so one side's wins are the other's losses
+        losses = games - wins - draws
+        while node >= 0:
+            self.visits[node] += games
+            self.wins[node] += wins + 0.5 * draws
+            wins, losses = losses, wins
+            node = self.parent[node]
+
+    def search(self, deadline, max_playouts=None):
+        #---------------------------------------------------------------------------
+        # Iterate until time.time() >= deadline or max_playouts iterations;
+        # returns the number of iterations.
+        #---------------------------------------------------------------------------
+        playouts = 0
+        while max_playouts is None or playouts < max_playouts:
+            if self.solved():
+                break
+            self.iterate()
+            playouts += 1
+            if playouts % 16 == 0 and time.time() >= deadline:
+                break
+        return playouts
+
+    def solved(self):
+        #---------------------------------------------------------------------------
+        # True when more playouts cannot change the move: the game is over at
+        # the root, or the side to move has an immediate win (then only the
+        # winning moves were expanded).
+        #---------------------------------------------------------------------------
+        if self.result[0] is not None:
+            return True
+        first = self.first_child[0]
+        return first >= 0 and self.result[first] == self.to_move
+
+    def children(self, node=0):
+        first = self.first_child[node]
+        return range(first, first + self.num_children[node]) if first >= 0 else range(0)
+
+    def best_child(self, node=0):
+        # Most visited child (ties to the higher win count)
+        return max(self.children(node), key=lambda c: (self.visits[c], self.wins[c]), default=-1)
+
+    def best_move(self):
+        child = self.best_child()
+        return self.move[child] if child >= 0 else None
+
+    def reuse(self, board, to_move, max_depth=2):
+        #---------------------------------------------------------------------------
+        # Find the node for board within max_depth plies of the root and make
+        # it the new root, keeping its subtree.  Returns False if it is not
+        # in the tree (the caller then starts a new tree).
+        #---------------------------------------------------------------------------
+        target = (board.mask('w'), board.mask('b'))
+        found = self._find(0, target, self.to_move, max_depth)
+        if found < 0:
+            return False
+        self._compact(found)
+        self.board = bitboard.BitBoard.from_masks(*target)
+        self.to_move = to_move
+        return True
+
+    def _find(self, node, target, token, depth):
+        board = self.board
+        if (board.white, board.black) == target:
+            return node
+        if depth == 0:
+            return -1
+        for child in self.children(node):
+            undo = board.make_move(self.move[child], token)
+            found = self._find(child, target, opponent_of(token), depth - 1)
+            board.unmake_move(undo)
+            if found >= 0:
+                return found
+        return -1
+
+    def _compact(self, root):
+        #---------------------------------------------------------------------------
+        # Rebuild the arrays with only the subtree under root, keeping every
+        # child block contiguous.
+        #---------------------------------------------------------------------------
+        old = (self.parent, self.move, self.first_child, self.num_children,
+               self.visits, self.wins, self.result)
+        o_parent, o_move, o_first, o_count, o_visits, o_wins, o_result = old
+        self._clear()
+        self._new_node(-1, -1, o_result[root])
+        self.visits[0] = o_visits[root]
+        self.wins[0] = o_wins[root]
+        queue = [(root, 0)]
+        while queue:
+            old_node, new_node = queue.pop()
+            if o_first[old_node] < 0:
+                continue
+            self.first_child[new_node] = len(self.parent)
+            self.num_children[new_node] = o_count[old_node]
+            for old_child in range(o_first[old_node], o_first[old_node] + o_count[old_node]):
+                new_child = self._new_node(new_node, o_move[old_child], o_result[old_child])
+                self.visits[new_child] = o_visits[old_child]
+                self.wins[new_child] = o_wins[old_child]
+                queue.append((old_child, new_child))
+
+    def summary(self, top=5):
+        #---------------------------------------------------------------------------
+        # [(move text, visits, win rate)] for the most visited root moves.
+        #---------------------------------------------------------------------------
+        ranked = sorted(self.children(), key=lambda c: -self.visits[c])[:top]
+        return [(pentago.MOVE_TEXT[self.move[c]], self.visits[c],
+                 self.wins[c] / self.visits[c] if self.visits[c] else 0.0) for c in ranked]
@@ -0,0 +1,162 @@
+# ---------------------------------------------------------------------------
+# Win detection with precomputed five-in-a-row line masks.
+# Boards are described by one bitmask per player, cell [i][j] being bit i*6+j
+# (see bitboard.py).  Any board object providing mask(token) can be used.
+# ---------------------------------------------------------------------------
+import bitboard
+
+BOARD_SIZE = 6
+WIN_LENGTH = 5
+
+
+def _build_lines():
+    #---------------------------------------------------------------------------
+    # All 32 winning lines: 12 horizontal, 12 vertical and 4 on each diagonal
+    # direction.  Also returns, per direction, the bit shift between successive
+    # cells of a line and the mask of cells where such a line can start.
+    #---------------------------------------------------------------------------
+    directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
+    lines = []
+    shifts = []
+    for di, dj in directions:
+        starts = 0
+        for i in range(BOARD_SIZE):
+            for j in range(BOARD_SIZE):
+                end_i = i + di*(WIN_LENGTH-1)
+                end_j = j + dj*(WIN_LENGTH-1)
+                if not (0 <= end_i < BOARD_SIZE and 0 <= end_j < BOARD_SIZE):
+                    continue
+                starts |= 1 << (i*BOARD_SIZE + j)
+                lines.append(sum(1 << ((i + di*k)*BOARD_SIZE + j + dj*k) for k in range(WIN_LENGTH)))
+        shifts.append((di*BOARD_SIZE + dj, starts))
+    return lines, shifts
+
+
+WIN_MASKS, _DIRECTIONS = _build_lines()
+(_H_SHIFT, _H_STARTS), (_V_SHIFT, _V_STARTS), (_D_SHIFT, _D_STARTS), (_A_SHIFT, _A_STARTS) = _DIRECTIONS
+
+# Lines through each cell, used when only the neighbourhood of a move matters.
+LINES_THROUGH_CELL = [[m for m in WIN_MASKS if m >> k & 1] for k in range(BOARD_SIZE*BOARD_SIZE)]
+
+
+def has_five(mask):
+    #---------------------------------------------------------------------------
+    # True if the stones in mask contain at least one five-in-a-row.  Each
+    # direction is tested with one shift-and chain over the whole board.
+    #---------------------------------------------------------------------------
+    s = _H_SHIFT
+    if mask & (mask >> s) & (mask >> 2*s) & (mask >> 3*s) & (mask >> 4*s) & _H_STARTS:
+        return True
+    s = _V_SHIFT
+    if mask & (mask >> s) & (mask >> 2*s) & (mask >> 3*s) & (mask >> 4*s) & _V_STARTS:
+        return True
+    s = _D_SHIFT
+    if mask & (mask >> s) & (mask >> 2*s) & (mask >> 3*s) & (mask >> 4*s) & _D_STARTS:
+        return True
+    s = _A_SHIFT
+    if mask & (mask >> s) & (mask >> 2*s) & (mask >> 3*s) & (mask >> 4*s) & _A_STARTS:
+        return True
+    return False
+
+
+def complete_lines(mask):
+    # Masks of every winning line fully covered by the stones in mask.
+    return [line for line in WIN_MASKS if mask & line == line]
+
+
+def count_lines(mask):
+    return len(complete_lines(mask))
+
+
+def winners(board):
+    #---------------------------------------------------------------------------
+    # (white has five, black has five).  Both can be True after a rotation,
+    # which game.Game reports as a tie.
+    #---------------------------------------------------------------------------
+    return has_five(board.mask('w')), has_five(board.mask('b'))
+
+
+def both_win(board):
+    white, black = winners(board)
+    return white and black
+
+
+def token_wins(board, token):
+    return has_five(board.mask(token))
+
+
+def _popcount(bits):
+    return bin(bits).count("1")
+
+
+def completing_cells(own, empty):
+    #---------------------------------------------------------------------------
+    # Cells of empty on which one more stone of own makes a five.  For every
+    # direction and every position k in a five-cell window, the windows with
+    # own stones everywhere but an empty cell at k are found with one chain
+    # of shifts and ands.
+    #---------------------------------------------------------------------------
+    cells = 0
+    for s, starts in _DIRECTIONS:
+        a0 = own & starts
+        a1 = own >> s
+        a2 = own >> 2*s
+        a3 = own >> 3*s
+        a4 = own >> 4*s
+        e0 = empty & starts
+        cells |= e0 & a1 & a2 & a3 & a4
+        a34 = a3 & a4
+        cells |= (a0 & (empty >> s) & a2 & a34) << s
+        a01 = a0 & a1
+        cells |= (a01 & (empty >> 2*s) & a34) << 2*s
+        a012 = a01 & a2
+        cells |= (a012 & (empty >> 3*s) & a4) << 3*s
+        cells |= (a012 & a3 & (empty >> 4*s)) << 4*s
+    return cells
+
+
+def winning_moves(own, opp):
+    #---------------------------------------------------------------------------
+    # Move codes (see pentago.MOVE_TEXT) with which the player owning the
+    # stones in own makes a five while the opponent (opp) does not.  For each
+    # of the 8 block rotations the rotated stones are tested against the line
+    # masks: a line missing exactly one stone gives a target cell (found by
+    # completing_cells), and the move places on that cell, or on its pre-image when the cell lies inside
+    # the rotated block.
+    #---------------------------------------------------------------------------
+    if _popcount(own) < WIN_LENGTH - 1:
+        return []
+    wins = []
+    occupied = own | opp
+    for rotation in range(8):
+        gameBlock = rotation // 2 + 1
+        qmask = bitboard.QUADRANT_MASK[gameBlock]
+        if rotation % 2:
+            table, inverse = bitboard.ROTATE_RIGHT[gameBlock], bitboard.ROTATE_LEFT[gameBlock]
+        else:
+            table, inverse = bitboard.ROTATE_LEFT[gameBlock], bitboard.ROTATE_RIGHT[gameBlock]
+        own_r = (own & ~qmask) | table[own & qmask]
+        opp_r = (opp & ~qmask) | table[opp & qmask]
+        if has_five(opp_r):
+            continue  # the rotation completes an opponent line: at best a tie
+        empty_r = bitboard.FULL_MASK & ~(own_r | opp_r)
+        if has_five(own_r):
+            targets = empty_r  # the rotation alone wins; any placement will do
+        else:
+            targets = completing_cells(own_r, empty_r)
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            if target & qmask:
+                target = inverse[target]
+            wins.append((target.bit_length() - 1) * 8 + rotation)
+    wins.sort()
+    return wins
+
+
+def threat_cells(own, opp):
+    # Bitmask of the cells on which own has a winning move
+    cells = 0
+    for move in winning_moves(own, opp):
+        cells |= 1 << (move >> 3)
+    return cells
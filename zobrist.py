@@ -0,0 +1,67 @@
+import random
+
+# ---------------------------------------------------------------------------
+# Zobrist keys for Pentago positions.
+# The hash of a position is the XOR of KEYS[token][cell] over its stones
+# (cell = i*6 + j).  Boards keep it up to date in make_move/unmake_move, so a
+# position reached through different move orders or rotations gets the same
+# key without rescanning the board.
+# ---------------------------------------------------------------------------
+
+NUM_CELLS = 36
+TOKENS = ('w', 'b')
+
+_rng = random.Random(0x9E3779B97F4A7C15)  # fixed seed: keys are stable across runs
+KEYS = {token: [_rng.getrandbits(64) for _ in range(NUM_CELLS)] for token in TOKENS}
+# XORed in when the player other than the searching agent is to move.
+SIDE_KEY = _rng.getrandbits(64)
+
+
+def hash_cells(cells):
+    #---------------------------------------------------------------------------
+    # Hash of a sequence of 36 cells ('w', 'b' or '.') in row-major order.
+    #---------------------------------------------------------------------------
+    h = 0
+    for k, cell in enumerate(cells):
+        if cell != '.':
+            h ^= KEYS[cell][k]
+    return h
+
+
+def hash_masks(white, black):
+    h = 0
+    k = 0
+    while white or black:
+        if white & 1:
+            h ^= KEYS['w'][k]
+        if black & 1:
+            h ^= KEYS['b'][k]
+        white >>= 1
+        black >>= 1
+        k += 1
+    return h
+
+
+def build_block_tables(quadrant_masks):
+    #---------------------------------------------------------------------------
+    # BLOCK_HASH[token][gameBlock][bits]: hash contribution of the stones bits
+    # (already masked to gameBlock).  Used to rehash a block after a rotation
+    # with two lookups per player.
+    #---------------------------------------------------------------------------
+    tables = {}
+    for token in TOKENS:
+        per_block = [None]
+        for qmask in quadrant_masks[1:]:
+            cells = [k for k in range(NUM_CELLS) if qmask >> k & 1]
+            table = {}
+            for pattern in range(1 << len(cells)):
+                bits = 0
+                h = 0
+                for n, k in enumerate(cells):
+                    if pattern >> n & 1:
+                        bits |= 1 << k
+                        h ^= KEYS[token][k]
+                table[bits] = h
+            per_block.append(table)
+        tables[token] = per_block
+    return tables